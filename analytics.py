@@ -0,0 +1,280 @@
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import and_, delete, event, insert, select, text, update
+
+from models import db, ArchivedClaim, ClaimRollup, WarrantyClaim
+from replicas import RoutingSession
+
+logger = logging.getLogger(__name__)
+
+# Claim analytics are served from claim_rollups, which holds counts per
+# (period, dimension, bucket, value). Rows are adjusted in the same
+# transaction as the claim write that changes them:
+# - new claims through the app's session (db.session), by the after_flush listener below
+# - bulk imports and status transitions, by record_created/record_transitions
+# Each adjustment is an atomic upsert (count = count + delta), so concurrent
+# writers never lose updates. `flask analytics rebuild` recomputes
+# everything from warranty_claims and archived_claims, e.g. after upgrading.
+# Archiving a claim leaves its counts in place.
+#
+# Totals over all claims (dimension 'all') are not stored: a row every
+# writer updated would serialize all claim writes. Every claim has exactly
+# one defect reason, so the totals are summed from that dimension's rows
+# when read.
+#
+# Buckets are by created_at (UTC): a week starts on Monday, a month on the 1st.
+# Turnaround is the time from creation to approval or rejection.
+
+PERIODS = ('day', 'week', 'month')
+DIMENSIONS = ('all', 'defect_reason', 'warranty_option', 'product')
+STORED_DIMENSIONS = ('defect_reason', 'warranty_option', 'product')
+TOTALS_DIMENSION = 'defect_reason'  # Read for 'all': it counts every claim once
+STATUS_COLUMNS = ('pending', 'approved', 'rejected')
+TURNAROUND_COLUMNS = {'approved': 'approval_seconds', 'rejected': 'rejection_seconds'}
+COUNT_COLUMNS = ('claims',) + STATUS_COLUMNS + tuple(TURNAROUND_COLUMNS.values())
+KEY_COLUMNS = ('period', 'dimension', 'bucket', 'value')
+CLAIM_COLUMNS = ('created_at', 'updated_at', 'status', 'defect_reason', 'warranty_option', 'product')
+
+# Default range per period, and the most buckets one request may span
+DEFAULT_SPANS = {'day': 30, 'week': 12, 'month': 12}
+MAX_BUCKETS = 400
+TOP_VALUES = 10
+
+
+def bucket_start(period, moment):
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(period, bucket):
+    if period == 'week':
+        return bucket + timedelta(weeks=1)
+    if period == 'month':
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return bucket + timedelta(days=1)
+
+
+def bucket_count(period, first, last):
+    if period == 'week':
+        return (last - first).days // 7 + 1
+    if period == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days + 1
+
+
+def rollup_keys(claim):
+    """The (period, dimension, bucket, value) rows a claim is counted in"""
+    for period in PERIODS:
+        bucket = bucket_start(period, claim['created_at'])
+        for dimension in STORED_DIMENSIONS:
+            yield period, dimension, bucket, claim[dimension]
+
+
+def claim_deltas(claims, deltas=None):
+    """Add claims (mappings of CLAIM_COLUMNS) to a deltas dict, as they are now"""
+    deltas = defaultdict(Counter) if deltas is None else deltas
+    for claim in claims:
+        status = claim['status']
+        seconds = None
+        if status in TURNAROUND_COLUMNS and claim.get('updated_at'):
+            seconds = int((claim['updated_at'] - claim['created_at']).total_seconds())
+        for key in rollup_keys(claim):
+            counts = deltas[key]
+            counts['claims'] += 1
+            counts[status] += 1
+            if seconds is not None:
+                counts[TURNAROUND_COLUMNS[status]] += seconds
+    return deltas
+
+
+def transition_deltas(claims, old_status, new_status, decided_at):
+    """Move claims from old_status to new_status in their buckets"""
+    deltas = defaultdict(Counter)
+    for claim in claims:
+        seconds = int((decided_at - claim['created_at']).total_seconds())
+        for key in rollup_keys(claim):
+            counts = deltas[key]
+            counts[old_status] -= 1
+            counts[new_status] += 1
+            if new_status in TURNAROUND_COLUMNS:
+                counts[TURNAROUND_COLUMNS[new_status]] += seconds
+    return deltas
+
+
+def upsert_statement(dialect):
+    table = ClaimRollup.__table__
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    statement = dialect_insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={column: table.c[column] + statement.excluded[column] for column in COUNT_COLUMNS}
+    )
+
+
+def apply_deltas(connection, deltas):
+    """Add the deltas to claim_rollups, creating rows as needed"""
+    rows = [
+        dict(zip(KEY_COLUMNS, key), **{column: counts[column] for column in COUNT_COLUMNS})
+        for key, counts in sorted(deltas.items())  # Same lock order in every transaction
+        if any(counts[column] for column in COUNT_COLUMNS)
+    ]
+    if not rows:
+        return
+
+    statement = upsert_statement(connection.dialect.name)
+    if statement is not None:
+        connection.execute(statement, rows)
+        return
+
+    # No upsert support: update, then insert the rows that did not exist
+    table = ClaimRollup.__table__
+    for row in rows:
+        result = connection.execute(
+            update(table).where(and_(*[table.c[column] == row[column] for column in KEY_COLUMNS])).values(
+                {column: table.c[column] + row[column] for column in COUNT_COLUMNS}
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(row))
+
+
+def record_created(session, claims):
+    """Count claims inserted outside the ORM (e.g. bulk imports); the caller commits"""
+    apply_deltas(session.connection(), claim_deltas(claims))
+
+
+def record_transitions(session, claims, old_status, new_status, decided_at):
+    """Count claims moved by a bulk status UPDATE; the caller commits"""
+    apply_deltas(session.connection(), transition_deltas(claims, old_status, new_status, decided_at))
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def roll_up_new_claims(session, flush_context):
+    # session.new still lists the objects that were just inserted
+    claims = [
+        {column: getattr(obj, column) for column in CLAIM_COLUMNS}
+        for obj in session.new if isinstance(obj, WarrantyClaim)
+    ]
+    if claims:
+        apply_deltas(session.connection(), claim_deltas(claims))
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def bucket_range(period, date_from=None, date_to=None):
+    """First and last bucket for a request, defaulting to the recent past"""
+    last = bucket_start(period, date_to or datetime.utcnow().date())
+    if date_from:
+        first = bucket_start(period, date_from)
+    else:
+        first = last
+        for _ in range(DEFAULT_SPANS[period] - 1):
+            first = bucket_start(period, first - timedelta(days=1))
+    return first, last
+
+
+def summarize(counts):
+    """Counts for the API, with average turnaround in hours"""
+    summary = {column: counts[column] for column in ('claims',) + STATUS_COLUMNS}
+    for status, column in TURNAROUND_COLUMNS.items():
+        average = counts[column] / counts[status] / 3600 if counts[status] else None
+        summary[f'avg_{column[:-len("_seconds")]}_hours'] = round(average, 2) if average is not None else None
+    return summary
+
+
+def claim_analytics(period, dimension, first, last, limit=TOP_VALUES):
+    """Claim counts per bucket for the top `limit` values of a dimension, from the rollups"""
+    everything = dimension == 'all'
+    rows = db.session.execute(
+        select(ClaimRollup).where(
+            ClaimRollup.period == period,
+            ClaimRollup.dimension == (TOTALS_DIMENSION if everything else dimension),
+            ClaimRollup.bucket.between(first, last)
+        )
+    ).scalars().all()
+    # (bucket, value, counts); for 'all', one value ('') summed over every defect reason
+    entries = [(row.bucket, '' if everything else row.value, Counter({
+        column: getattr(row, column) for column in COUNT_COLUMNS
+    })) for row in rows]
+
+    totals = defaultdict(Counter)
+    for _, value, counts in entries:
+        totals[value].update(counts)
+    top = sorted(totals, key=lambda value: (-totals[value]['claims'], value))[:limit]
+    shown = set(top)
+
+    buckets = {}
+    bucket = first
+    while bucket <= last:
+        buckets[bucket] = defaultdict(Counter)
+        bucket = next_bucket(period, bucket)
+    for bucket, value, counts in entries:
+        if value in shown:
+            buckets[bucket][value].update(counts)
+
+    return {
+        'period': period,
+        'dimension': dimension,
+        'from': first.isoformat(),
+        'to': last.isoformat(),
+        'values': [dict(value=value, **summarize(totals[value])) for value in top],
+        'other_values': len(totals) - len(top),
+        'buckets': [
+            {
+                'bucket': bucket.isoformat(),
+                'values': {value: summarize(counts) for value, counts in values.items()}
+            }
+            for bucket, values in buckets.items()
+        ]
+    }
+
+
+def rebuild_rollups(batch_size=5000):
+    """Recompute claim_rollups from warranty_claims and archived_claims; returns the number of claims counted"""
+    if db.engine.dialect.name == 'postgresql':
+        # Hold off claim writes (and archiving) so none is counted twice or missed
+        db.session.execute(text('LOCK TABLE warranty_claims IN SHARE MODE'))
+    db.session.execute(delete(ClaimRollup))
+
+    deltas = defaultdict(Counter)
+    counted = 0
+    for model in (WarrantyClaim, ArchivedClaim):
+        query = select(*[getattr(model, column) for column in CLAIM_COLUMNS]).execution_options(
+            yield_per=batch_size
+        )
+        for row in db.session.execute(query):
+            claim_deltas([row._mapping], deltas)
+            counted += 1
+    apply_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    return counted
+
+
+analytics_cli = AppGroup('analytics', help='Claim analytics rollups.')
+
+
+@analytics_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Recompute the claim rollups from the claims table."""
+    counted = rebuild_rollups()
+    click.echo(f"Rolled up {counted} claims")
+
+
+def init_analytics(app):
+    app.cli.add_command(analytics_cli)
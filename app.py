@@ -1,22 +1,43 @@
 import os
-import random
-import string
 import logging
 import traceback
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, session, Response, send_file, jsonify, send_from_directory
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, session, Response, send_file, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import get_input_stream
 import uuid
-from models import db, WarrantyClaim
-from flask_sqlalchemy import SQLAlchemy
-from dotenv import load_dotenv
+from models import db, WarrantyClaim, ArchivedClaim
+from storage import create_storage, create_archive_storage, key_digest
+from jobs import init_jobs, enqueue
+from pooling import engine_options, pool_stats
+from metrics import init_metrics
+from middleware import BufferRequestBody
+from references import init_references, generate_reference_number
+from cache import init_cache, claim_cache, claim_key, record_claim_changes, RECORDED_OPTION, STATUS_COUNTS_KEY
+from search import install_search_index, match_condition, search_claims, search_terms
+from sessions import init_sessions, schedule_session_purge
+from assets import init_assets
+from importer import init_importer, import_stream, ImportFailed, IMPORT_FORMATS
+from uploads import init_uploads
+from archive import find_archived_claim
+from replicas import init_replicas, read_replica
+from ratelimit import init_rate_limits
+from events import init_events, dashboard_events, event_stream, record_status_change
+from analytics import init_analytics, record_transitions, claim_analytics, bucket_range, bucket_count, parse_date, PERIODS, DIMENSIONS, MAX_BUCKETS, TOP_VALUES
+from validation import missing_fields, valid_purchase_date, oversized_fields
+from duplicates import submission_key, find_submission, normalize_email, issue_simhash, find_near_duplicate
+from tasks import mail
+from werkzeug.utils import send_file as werkzeug_send_file
+import click
 import hmac
 import time
-from flask_session import Session
-import redis
-
-# Load environment variables
-load_dotenv()
+import base64
+import csv
+import io
+import zlib
+from sqlalchemy import or_, and_, update, select, func
+from sqlalchemy.exc import IntegrityError
 
 # Configure logging
 logging.basicConfig(
@@ -26,59 +47,176 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app
-app = Flask(__name__)
+# Importing this module only defines things. create_app() builds the app
+# without touching the database or Redis, so gunicorn workers (including
+# ones recycled by max_requests) start quickly. The schema is created by
+# migrations (`flask db upgrade`) or `flask init-db`, never on import.
+bp = Blueprint('main', __name__)
 
-# Basic configuration
-app.config.update(
-    SECRET_KEY=os.environ.get('SECRET_KEY', 'dev-key-123'),
-    UPLOAD_FOLDER=os.environ.get('UPLOAD_FOLDER', 'uploads'),
-    MAX_CONTENT_LENGTH=5 * 1024 * 1024,  # 5MB max file size
-)
+def load_config(app):
+    """Read the app configuration from the environment"""
+    # Basic configuration
+    app.config.update(
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'dev-key-123'),
+        UPLOAD_FOLDER=os.environ.get('UPLOAD_FOLDER', 'uploads'),
+        MAX_CONTENT_LENGTH=5 * 1024 * 1024,  # 5MB max file size
+        STORAGE_BACKEND=os.environ.get('STORAGE_BACKEND', 'local'),  # 'local' or 's3'
+        S3_BUCKET=os.environ.get('S3_BUCKET'),
+        S3_PREFIX=os.environ.get('S3_PREFIX', 'uploads/'),
+        S3_ENDPOINT_URL=os.environ.get('S3_ENDPOINT_URL'),
+        # Retention: closed claims move to archived_claims, and their uploads to the archive storage
+        ARCHIVE_AFTER_DAYS=int(os.environ.get('ARCHIVE_AFTER_DAYS', 365)),
+        ARCHIVE_STORAGE_BACKEND=os.environ.get('ARCHIVE_STORAGE_BACKEND'),  # Defaults to STORAGE_BACKEND
+        ARCHIVE_FOLDER=os.environ.get('ARCHIVE_FOLDER', 'archive'),
+        ARCHIVE_S3_BUCKET=os.environ.get('ARCHIVE_S3_BUCKET'),  # Defaults to S3_BUCKET
+        ARCHIVE_S3_PREFIX=os.environ.get('ARCHIVE_S3_PREFIX', 'archive/'),
+        ARCHIVE_S3_STORAGE_CLASS=os.environ.get('ARCHIVE_S3_STORAGE_CLASS', 'STANDARD_IA'),
+        # Hand file delivery to the front proxy: 'none', 'x-accel' (nginx) or 'x-sendfile' (Apache/lighttpd)
+        DOWNLOAD_OFFLOAD=os.environ.get('DOWNLOAD_OFFLOAD', 'none'),
+        # nginx `internal` location that maps to UPLOAD_FOLDER
+        X_ACCEL_PREFIX=os.environ.get('X_ACCEL_PREFIX', '/protected-uploads/'),
+        # Bulk claim import API: body size limit and bearer token for partner feeds
+        IMPORT_MAX_SIZE=int(os.environ.get('IMPORT_MAX_SIZE', 200 * 1024 * 1024)),
+        IMPORT_API_TOKEN=os.environ.get('IMPORT_API_TOKEN'),
+        # Admin credentials
+        ADMIN_USERNAME=os.environ.get('ADMIN_USERNAME'),
+        ADMIN_PASSWORD=os.environ.get('ADMIN_PASSWORD'),
+        REDIS_URL=os.environ.get('REDIS_URL'),
+        BUFFER_REQUEST_BODY=os.environ.get('BUFFER_REQUEST_BODY', 'false').lower() == 'true',
+        # Admission control: per-IP rates (e.g. '5/minute', empty to disable) and in-flight upload cap (0 to disable)
+        RATE_LIMIT_SUBMIT=os.environ.get('RATE_LIMIT_SUBMIT', '5/minute'),
+        RATE_LIMIT_LOGIN=os.environ.get('RATE_LIMIT_LOGIN', '10/minute'),
+        UPLOAD_CONCURRENCY=int(os.environ.get('UPLOAD_CONCURRENCY', 20)),
+        # Unique per host (0-1023), so claim references never collide across hosts
+        REFERENCE_NODE_ID=int(os.environ.get('REFERENCE_NODE_ID', 0)),
+        # Proxies in front of the app that append to X-Forwarded-For (1 behind a single load balancer)
+        TRUSTED_PROXY_COUNT=int(os.environ.get('TRUSTED_PROXY_COUNT', 0)),
+        # Live dashboard updates: how long one event stream stays open (0 answers
+        # and closes, for sync workers), the browser's reconnect delay, and how
+        # many events are kept for reconnecting dashboards
+        EVENT_STREAM_SECONDS=float(os.environ.get('EVENT_STREAM_SECONDS', 0)),
+        EVENT_RETRY_SECONDS=float(os.environ.get('EVENT_RETRY_SECONDS', 5)),
+        EVENT_BACKLOG=int(os.environ.get('EVENT_BACKLOG', 1000)),
+    )
 
-# Configure static files
-app.static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
-app.static_url_path = '/static'
+    # Mail configuration (emails are sent by the background worker)
+    app.config.update(
+        MAIL_SERVER=os.environ.get('MAIL_SERVER', 'localhost'),
+        MAIL_PORT=int(os.environ.get('MAIL_PORT', 25)),
+        MAIL_USE_TLS=os.environ.get('MAIL_USE_TLS', 'false').lower() == 'true',
+        MAIL_USERNAME=os.environ.get('MAIL_USERNAME'),
+        MAIL_PASSWORD=os.environ.get('MAIL_PASSWORD'),
+        MAIL_DEFAULT_SENDER=os.environ.get('MAIL_DEFAULT_SENDER', 'no-reply@localhost'),
+        CACHE_TTL=os.environ.get('CACHE_TTL'),
+        ADMIN_NOTIFY_EMAILS=[e.strip() for e in os.environ.get('ADMIN_NOTIFY_EMAILS', '').split(',') if e.strip()],
+    )
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///warranty_claims.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///warranty_claims.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Read replicas for read-only admin routes (comma-separated URLs)
+    app.config['DATABASE_REPLICA_URLS'] = os.environ.get('DATABASE_REPLICA_URLS')
+    app.config['REPLICA_MAX_LAG'] = float(os.environ.get('REPLICA_MAX_LAG', 5))
+    app.config['REPLICA_CHECK_INTERVAL'] = float(os.environ.get('REPLICA_CHECK_INTERVAL', 2))
 
-# Session configuration
-if os.environ.get('FLASK_ENV') == 'production':
-    try:
-        redis_url = os.environ.get('REDIS_URL')
-        if redis_url:
-            app.config['SESSION_TYPE'] = 'redis'
-            app.config['SESSION_REDIS'] = redis.from_url(redis_url)
-            logger.info("Using Redis for session storage")
-        else:
-            app.config['SESSION_TYPE'] = 'filesystem'
-            app.config['SESSION_FILE_DIR'] = os.path.join(app.root_path, 'flask_session')
-            logger.warning("Redis URL not set, using filesystem sessions")
-    except Exception as e:
-        logger.error(f"Redis connection failed: {str(e)}")
-        app.config['SESSION_TYPE'] = 'filesystem'
-        app.config['SESSION_FILE_DIR'] = os.path.join(app.root_path, 'flask_session')
-else:
-    app.config['SESSION_TYPE'] = 'filesystem'
-    app.config['SESSION_FILE_DIR'] = os.path.join(app.root_path, 'flask_session')
-
-# Ensure upload and session directories exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
-os.makedirs(os.path.join(app.static_folder, 'css'), exist_ok=True)
-
-# Initialize extensions
-db.init_app(app)
-
-# Create database tables
-with app.app_context():
-    try:
-        db.create_all()
-        logger.info("Database tables created successfully")
-    except Exception as e:
-        logger.error(f"Error creating database tables: {str(e)}")
+    # Session configuration: customers get a small signed cookie, admins a
+    # server-side session (Redis when configured, otherwise the database)
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=int(os.environ.get('ADMIN_SESSION_HOURS', 12)))
+
+def create_redis_client(url):
+    """Redis is shared by admin sessions, the cache and the job queue"""
+    if not url:
+        return None
+    # Imported here so deployments without Redis never load the client
+    import redis
+    # from_url only builds a connection pool; nothing connects until first use
+    return redis.from_url(url)
+
+def init_migrations(app):
+    # Alembic is only needed by the `flask db` commands, so web workers
+    # skip importing it (the flask CLI sets FLASK_RUN_FROM_CLI)
+    if os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+        return
+    from flask_migrate import Migrate
+    Migrate(app, db, directory=os.path.join(app.root_path, 'migrations'))
+
+def init_database(app):
+    """Create missing tables and the SQLite search index.
+
+    Deployments run `flask db upgrade` instead; this is for local SQLite
+    databases and is called by `flask init-db` and the dev entry points.
+    """
+    with app.app_context():
+        try:
+            db.create_all()
+            install_search_index(db.engine)
+            logger.info("Database tables created successfully")
+        except Exception as e:
+            logger.error(f"Error creating database tables: {str(e)}")
+
+@click.command('init-db')
+def init_db_command():
+    """Create missing tables and the SQLite search index."""
+    init_database(current_app._get_current_object())
+
+def create_app(config=None):
+    """Build the app; connects to nothing, so it is cheap to call in every worker"""
+    # Load environment variables
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    app = Flask(__name__)
+    load_config(app)
+    if config:
+        app.config.update(config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    # Under gevent workers, receive request bodies fully before the app runs
+    if app.config['BUFFER_REQUEST_BODY']:
+        app.wsgi_app = BufferRequestBody(app.wsgi_app, app.config['MAX_CONTENT_LENGTH'], {
+            '/admin/api/claims/import': app.config['IMPORT_MAX_SIZE']
+        })
+
+    # Configure static files
+    app.static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    app.static_url_path = '/static'
+
+    redis_client = create_redis_client(app.config['REDIS_URL'])
+
+    # Initialize extensions
+    app.extensions['redis'] = redis_client
+    app.extensions['storage'] = create_storage(app.config)
+    app.extensions['archive_storage'] = create_archive_storage(app.config)
+    db.init_app(app)
+    mail.init_app(app)
+    init_references(app)
+    init_jobs(app, redis_client)
+    init_metrics(app)
+    init_cache(app, redis_client)
+    init_sessions(app, redis_client)
+    init_assets(app)
+    init_importer(app)
+    init_analytics(app)
+    init_events(app, redis_client)
+    init_uploads(app)
+    init_replicas(app)
+    # Outermost, so refused requests never reach BufferRequestBody or Flask
+    init_rate_limits(app, redis_client)
+    init_migrations(app)
+    app.cli.add_command(init_db_command)
+
+    app.register_blueprint(bp)
+    return app
+
+def check_admin_credentials(username, password):
+    """Constant-time comparison against the configured admin credentials"""
+    admin_username = current_app.config['ADMIN_USERNAME']
+    admin_password = current_app.config['ADMIN_PASSWORD']
+    if not admin_username or not admin_password:
+        current_app.logger.error("ADMIN_USERNAME/ADMIN_PASSWORD are not configured")
+        return False
+    return (hmac.compare_digest(username.encode(), admin_username.encode())
+            & hmac.compare_digest(password.encode(), admin_password.encode()))
 
 # Allowed file extensions for upload
 ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx'}
@@ -87,21 +225,282 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def generate_reference_number():
-    """Generate a unique reference number for the warranty claim"""
-    prefix = "WC"
-    timestamp = datetime.now().strftime("%Y%m%d")
-    random_chars = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    return f"{prefix}-{timestamp}-{random_chars}"
+# Admin claims listing
+CLAIM_STATUSES = ('pending', 'approved', 'rejected')
+CLAIMS_PAGE_SIZE = 50
+CLAIMS_MAX_PAGE_SIZE = 200
+
+def encode_cursor(claim):
+    """Encode the (created_at, id) position of a claim as an opaque cursor"""
+    raw = f"{claim.created_at.isoformat()}|{claim.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor back into a (created_at, id) tuple"""
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    created_at, claim_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(claim_id)
+
+def claim_filters(statuses=None, search=None):
+    """Build the SQL conditions for the admin status and search filters"""
+    conditions = []
+    if statuses:
+        conditions.append(WarrantyClaim.status.in_(statuses))
+    if search:
+        conditions.append(match_condition(search))
+    return conditions
+
+def filter_claims(query, statuses=None, search=None):
+    """Apply the admin status and search filters to a claims query"""
+    return query.filter(*claim_filters(statuses, search))
+
+def paginate_claims(query, cursor=None, limit=CLAIMS_PAGE_SIZE):
+    """Return one page of claims (newest first) and the cursor for the next page"""
+    if cursor:
+        created_at, claim_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            WarrantyClaim.created_at < created_at,
+            and_(WarrantyClaim.created_at == created_at, WarrantyClaim.id < claim_id)
+        ))
+
+    rows = query.order_by(
+        WarrantyClaim.created_at.desc(),
+        WarrantyClaim.id.desc()
+    ).limit(limit + 1).all()
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def load_status_counts():
+    counts = dict.fromkeys(CLAIM_STATUSES, 0)
+    counts.update(db.session.query(WarrantyClaim.status, func.count(WarrantyClaim.id)).group_by(WarrantyClaim.status).all())
+    return counts
+
+def claim_status_counts():
+    """Number of claims per status, served from the cache"""
+    return claim_cache.get_or_load(STATUS_COUNTS_KEY, load_status_counts)
+
+def load_claim_payload(claim_id):
+    claim = db.session.get(WarrantyClaim, claim_id) or find_archived_claim(claim_id)
+    return claim.to_dict() if claim else None
+
+# CSV export
+EXPORT_COLUMNS = {
+    'reference_number': 'Reference Number',
+    'name': 'Name',
+    'email': 'Email',
+    'phone': 'Phone',
+    'product': 'Product',
+    'purchase_date': 'Purchase Date',
+    'issue': 'Issue',
+    'defect_reason': 'Defect Reason',
+    'warranty_option': 'Warranty Option',
+    'status': 'Status',
+    'created_at': 'Created At',
+    'updated_at': 'Updated At'
+}
+DEFAULT_EXPORT_COLUMNS = ['reference_number', 'name', 'email', 'phone', 'product',
+                          'defect_reason', 'warranty_option', 'created_at']
+EXPORT_BATCH_SIZE = 1000
+
+def generate_csv(rows, header):
+    """Yield the CSV header, then CSV text in chunks of EXPORT_BATCH_SIZE rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+def gzip_stream(chunks):
+    """Gzip a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(wbits=31)  # 31 selects the gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def save_upload(uploaded_file):
+    """Stream an upload into content-addressed storage and return its key"""
+    key = current_app.extensions['storage'].save(uploaded_file.stream, secure_filename(uploaded_file.filename))
+    current_app.logger.info(f'File stored successfully: {key}')
+    return key
+
+def send_local_file(path, download_name, etag=True, x_accel_path=None):
+    """Send a file from disk, offloading the transfer to the front proxy when configured"""
+    offload = current_app.config['DOWNLOAD_OFFLOAD']
+    # nginx can only serve files under the internal location, which maps UPLOAD_FOLDER
+    if offload == 'none' or (offload == 'x-accel' and not x_accel_path):
+        # Conditional requests, Range and ETag are handled by send_file; a full
+        # response goes out through wsgi.file_wrapper (sendfile under gunicorn).
+        return send_file(path, as_attachment=True, download_name=download_name, etag=etag)
+
+    response = werkzeug_send_file(
+        path,
+        request.environ,
+        as_attachment=True,
+        download_name=download_name,
+        etag=etag,
+        use_x_sendfile=True,
+        conditional=False
+    )
+    # The proxy serves the body and Range requests itself; only answer 304s here
+    response.headers.pop('Content-Length', None)
+    response = response.make_conditional(request.environ)
+    sendfile_path = response.headers.pop('X-Sendfile', None)
+
+    if response.status_code != 304 and sendfile_path:
+        if offload == 'x-accel' and x_accel_path:
+            response.headers['X-Accel-Redirect'] = current_app.config['X_ACCEL_PREFIX'] + x_accel_path
+        else:
+            response.headers['X-Sendfile'] = sendfile_path
+    return response
+
+def send_stored_file(key, download_name, archived=False):
+    """Send an upload from the storage layer (the archive storage for archived claims)"""
+    storage = current_app.extensions['archive_storage' if archived else 'storage']
+    local_path = storage.local_path(key)
+    if local_path is None:
+        return redirect(storage.url(key, download_name))
+
+    if archived:
+        # The proxy only maps UPLOAD_FOLDER; archived files are rare enough to send directly
+        return send_file(local_path, as_attachment=True, download_name=download_name, etag=key_digest(key))
 
-@app.route('/')
+    # Keys are content hashes, so the digest makes a strong ETag
+    return send_local_file(local_path, download_name, etag=key_digest(key), x_accel_path=key)
+
+def enqueue_post_submission(claim):
+    """Queue the follow-up work for a new claim so the request doesn't wait on it"""
+    try:
+        enqueue('send_confirmation_email', claim_id=claim.id)
+        enqueue('notify_admins', claim_id=claim.id)
+        if claim.file_path:
+            enqueue('process_upload', claim_id=claim.id)
+    except Exception as e:
+        # The claim is already saved; a queue outage must not fail the submission
+        logger.error(f"Error queueing follow-up jobs for claim {claim.id}: {str(e)}")
+
+# Status transitions
+STATUS_ACTIONS = {'approve': 'approved', 'reject': 'rejected'}
+BULK_MAX_IDS = 1000
+
+def transition_claims(new_status, conditions):
+    """Move matching pending claims to new_status in one conditional UPDATE.
+
+    Only rows that are still pending when the UPDATE runs are changed, so two
+    admins acting on the same claim can never both succeed. Returns the ids
+    that were changed; the caller commits.
+    """
+    if not conditions:
+        raise ValueError("transition_claims needs a condition; it would move every pending claim")
+    now = datetime.utcnow()
+    stmt = update(WarrantyClaim).where(
+        WarrantyClaim.status == 'pending', *conditions
+    ).values(status=new_status, updated_at=now)
+    # What the analytics rollups need to move each changed claim
+    changed_columns = (WarrantyClaim.id, WarrantyClaim.created_at, WarrantyClaim.defect_reason,
+                       WarrantyClaim.warranty_option, WarrantyClaim.product)
+    # The changed claims are passed to the cache below
+    options = {'synchronize_session': False, RECORDED_OPTION: True}
+
+    if db.engine.dialect.update_returning:
+        changed = db.session.execute(stmt.returning(*changed_columns), execution_options=options).all()
+    else:
+        # No UPDATE ... RETURNING (e.g. old MySQL): lock the candidates first
+        changed = db.session.execute(
+            select(*changed_columns).where(WarrantyClaim.status == 'pending', *conditions).with_for_update()
+        ).all()
+        if changed:
+            db.session.execute(
+                stmt.where(WarrantyClaim.id.in_([row.id for row in changed])),
+                execution_options=options
+            )
+
+    record_claim_changes(db.session, [row.id for row in changed])
+    record_transitions(db.session, [row._mapping for row in changed], 'pending', new_status, now)
+    record_status_change(db.session, [row.id for row in changed], new_status, now)
+    return [row.id for row in changed]
+
+def transition_claim(claim_id, action):
+    """Approve or reject a single claim, returning a JSON response"""
+    new_status = STATUS_ACTIONS[action]
+    changed = transition_claims(new_status, [WarrantyClaim.id == claim_id])
+    db.session.commit()
+
+    claim = WarrantyClaim.query.get_or_404(claim_id)
+    if not changed:
+        return jsonify({
+            'success': False,
+            'error': f'Cannot {action} claim that is already {claim.status}'
+        }), 400
+
+    current_app.logger.info(f'Claim {claim_id} {new_status} successfully')
+    return jsonify({
+        'success': True,
+        'message': f'Claim {claim.reference_number} has been {new_status}'
+    })
+
+def render_claim_form():
+    # Each rendered form carries its own key, so resubmitting it is a replay
+    return render_template('index.html', idempotency_key=uuid.uuid4().hex)
+
+def replay_submission(claim, notice=None):
+    """Send the customer to the confirmation of a claim that already exists"""
+    if notice:
+        flash(notice, 'info')
+    session['reference_number'] = claim.reference_number
+    session['claim_id'] = claim.id
+    return redirect(url_for('.confirmation'))
+
+# A near-duplicate of a pending claim is only folded into it when these match too
+REPEATED_FIELDS = ('name', 'phone', 'issue', 'defect_reason', 'warranty_option')
+REPEATED_NOTICE = 'We already have this claim and it is being reviewed, so it was not submitted again.'
+
+def check_existing_submission(fields, simhash, has_upload):
+    """(pending claim this submission repeats, earlier claim it duplicates)
+
+    A near-duplicate of a pending claim is folded into it only when nothing
+    would be lost: no upload and the same details. Other near-duplicates,
+    including those of claims that were already decided (the customer may
+    be following up), are saved and linked to the earlier claim.
+    """
+    duplicate = find_near_duplicate(fields['email'], fields['product'], fields['purchase_date'], simhash)
+    if duplicate is None or duplicate.status != 'pending':
+        return None, duplicate
+    if not has_upload and all(
+        (getattr(duplicate, field) or '').strip() == (fields[field] or '').strip() for field in REPEATED_FIELDS
+    ):
+        logger.info(f"Submission repeats pending claim {duplicate.reference_number}, not creating a new one")
+        return duplicate, None
+    logger.info(f"Submission near-duplicates pending claim {duplicate.reference_number} with new details, saving it")
+    return None, duplicate
+
+@bp.route('/')
 def index():
-    return render_template('index.html')
+    return render_claim_form()
 
-@app.route('/submit-claim', methods=['POST'])
+@bp.route('/submit-claim', methods=['POST'])
 def submit_claim():
     if request.method == 'POST':
         try:
+            # A retried or double-clicked submission gets the original result
+            idempotency_key = submission_key(request.form.get('email'))
+            replayed = find_submission(idempotency_key)
+            if replayed is not None:
+                logger.info(f"Replaying submission {idempotency_key} for claim {replayed.reference_number}")
+                return replay_submission(replayed)
+
             # Get form data
             name = request.form.get('name')
             email = request.form.get('email')
@@ -112,47 +511,60 @@ def submit_claim():
             defect_reason = request.form.get('defect-reason')
             warranty_option = request.form.get('warranty-option')
 
+            fields = {
+                'name': name,
+                'email': email,
+                'phone': phone,
+                'product': product,
+                'purchase_date': purchase_date,
+                'issue': issue,
+                'defect_reason': defect_reason,
+                'warranty_option': warranty_option
+            }
+
             # Validate required fields
-            if not all([name, email, phone, product, purchase_date, issue, defect_reason, warranty_option]):
-                missing_fields = [field for field, value in {
-                    'name': name,
-                    'email': email,
-                    'phone': phone,
-                    'product': product,
-                    'purchase_date': purchase_date,
-                    'issue': issue,
-                    'defect_reason': defect_reason,
-                    'warranty_option': warranty_option
-                }.items() if not value]
-                flash(f'Required fields missing: {", ".join(missing_fields)}', 'error')
-                return redirect(url_for('index'))
+            missing = missing_fields(fields)
+            if missing:
+                flash(f'Required fields missing: {", ".join(missing)}', 'error')
+                return redirect(url_for('.index'))
 
             # Validate date format
-            try:
-                datetime.strptime(purchase_date, '%Y-%m-%d')
-            except (ValueError, TypeError) as e:
-                logger.error(f"Date validation error: {str(e)}")
+            if not valid_purchase_date(purchase_date):
+                logger.error(f"Date validation error: {purchase_date!r}")
                 flash('Invalid purchase date format. Please use YYYY-MM-DD format.', 'error')
-                return redirect(url_for('index'))
+                return redirect(url_for('.index'))
 
-            # File upload handling
+            oversized = oversized_fields(fields)
+            if oversized:
+                flash(f'Fields too long: {", ".join(oversized)}', 'error')
+                return redirect(url_for('.index'))
+
+            # Check for duplicates before storing the upload
+            email = fields['email'] = normalize_email(email)
+            simhash = issue_simhash(issue)
             uploaded_file = request.files.get('supporting_document')
+            existing, duplicate_of = check_existing_submission(
+                fields, simhash, bool(uploaded_file and uploaded_file.filename)
+            )
+            if existing is not None:
+                return replay_submission(existing, REPEATED_NOTICE)
+
+            # File upload handling
             file_path = None
+            file_name = None
 
             if uploaded_file and uploaded_file.filename:
                 if not allowed_file(uploaded_file.filename):
                     flash('Invalid file type. Please upload PDF, JPG, JPEG, PNG files.', 'error')
-                    return redirect(url_for('index'))
+                    return redirect(url_for('.index'))
 
                 try:
-                    filename = secure_filename(uploaded_file.filename)
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    uploaded_file.save(file_path)
-                    app.logger.info(f'File saved successfully: {file_path}')
+                    file_path = save_upload(uploaded_file)
+                    file_name = secure_filename(uploaded_file.filename)
                 except Exception as e:
-                    app.logger.error(f'Error saving file: {str(e)}')
+                    current_app.logger.error(f'Error saving file: {str(e)}')
                     flash('Error saving file. Please try again.', 'error')
-                    return redirect(url_for('index'))
+                    return redirect(url_for('.index'))
 
             # Generate reference number
             reference_number = generate_reference_number()
@@ -170,263 +582,513 @@ def submit_claim():
                     defect_reason=defect_reason,
                     warranty_option=warranty_option,
                     file_path=file_path,
-                    status='pending'
+                    file_name=file_name,
+                    status='pending',
+                    idempotency_key=idempotency_key,
+                    issue_simhash=simhash,
+                    duplicate_of_id=duplicate_of.id if duplicate_of else None
                 )
 
                 # Add and commit to database
                 db.session.add(new_claim)
                 db.session.commit()
+                enqueue_post_submission(new_claim)
 
-                # Store data in session for confirmation page
+                # Only the id goes in the session cookie; confirmation loads the rest
                 session['reference_number'] = reference_number
                 session['claim_id'] = new_claim.id
-                session['submission_data'] = new_claim.to_dict()
 
-                return redirect(url_for('confirmation'))
+                return redirect(url_for('.confirmation'))
+
+            except IntegrityError:
+                # A concurrent request with the same key got there first
+                db.session.rollback()
+                replayed = find_submission(idempotency_key)
+                if replayed is None:
+                    raise
+                return replay_submission(replayed)
 
             except Exception as e:
                 logger.error(f"Database error: {str(e)}")
                 logger.error(f"Traceback: {traceback.format_exc()}")
                 db.session.rollback()
                 flash('Database error occurred. Please try again.', 'error')
-                return redirect(url_for('index'))
+                return redirect(url_for('.index'))
 
         except Exception as e:
             logger.error(f"General error: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
             flash(f'An error occurred: {str(e)}', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('.index'))
 
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
-@app.route('/confirmation')
+@bp.route('/confirmation')
 def confirmation():
     reference_number = session.get('reference_number')
     claim_id = session.get('claim_id')
 
     if not reference_number or not claim_id:
         flash('No claim submission found.', 'error')
-        return redirect(url_for('index'))
-
-    # Try to get the saved data from the session first for backward compatibility
-    submission_data = session.get('submission_data')
-
-    # If not in session, query the database
-    if not submission_data:
-        claim = WarrantyClaim.query.get(claim_id)
-        if not claim:
-            flash('Claim not found.', 'error')
-            return redirect(url_for('index'))
-
-        submission_data = {
-            'name': claim.name,
-            'email': claim.email,
-            'phone': claim.phone,
-            'product': claim.product,
-            'purchase_date': claim.purchase_date,
-            'issue': claim.issue,
-            'defect_reason': claim.defect_reason,
-            'warranty_option': claim.warranty_option,
-            'file_path': claim.file_path,
-            'timestamp': claim.created_at.isoformat(),
-            'reference_number': claim.reference_number
-        }
+        return redirect(url_for('.index'))
+
+    claim = db.session.get(WarrantyClaim, claim_id)
+    if not claim or claim.reference_number != reference_number:
+        flash('Claim not found.', 'error')
+        return redirect(url_for('.index'))
 
-    return render_template('confirmation.html', reference_number=reference_number, data=submission_data)
+    return render_template('confirmation.html', reference_number=reference_number, data=claim.to_dict())
 
-@app.route('/admin/login', methods=['GET', 'POST'])
+@bp.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     if request.method == 'POST':
         try:
             username = request.form.get('username')
             password = request.form.get('password')
             
-            app.logger.info(f"Login attempt for username: {username}")
+            current_app.logger.info(f"Login attempt for username: {username}")
             
             if not username or not password:
                 flash('Please enter both username and password', 'error')
-                app.logger.warning("Login attempt with missing credentials")
-                return redirect(url_for('admin_login'))
+                current_app.logger.warning("Login attempt with missing credentials")
+                return redirect(url_for('.admin_login'))
             
-            if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
+            if check_admin_credentials(username, password):
                 try:
+                    # New session id on login so a pre-login id is never authenticated
+                    session.rotate()
                     session['admin_authenticated'] = True
                     session.permanent = True
-                    app.logger.info("Admin login successful")
-                    return redirect(url_for('admin_dashboard'))
+                    schedule_session_purge(current_app._get_current_object())
+                    current_app.logger.info("Admin login successful")
+                    return redirect(url_for('.admin_dashboard'))
                 except Exception as e:
-                    app.logger.error(f"Session error during login: {str(e)}")
+                    current_app.logger.error(f"Session error during login: {str(e)}")
                     flash('Session error. Please try again.', 'error')
-                    return redirect(url_for('admin_login'))
+                    return redirect(url_for('.admin_login'))
             else:
                 flash('Invalid username or password', 'error')
-                app.logger.warning(f"Failed login attempt for username: {username}")
-                return redirect(url_for('admin_login'))
+                current_app.logger.warning(f"Failed login attempt for username: {username}")
+                return redirect(url_for('.admin_login'))
                 
         except Exception as e:
-            app.logger.error(f"Error during admin login: {str(e)}")
-            app.logger.error(traceback.format_exc())
+            current_app.logger.error(f"Error during admin login: {str(e)}")
+            current_app.logger.error(traceback.format_exc())
             flash('An error occurred during login. Please try again.', 'error')
-            return redirect(url_for('admin_login'))
+            return redirect(url_for('.admin_login'))
     
     return render_template('admin_login.html')
 
-@app.route('/admin/logout')
+@bp.route('/admin/logout')
 def admin_logout():
     try:
         session.clear()
         flash('You have been logged out successfully.', 'success')
-        return redirect(url_for('admin_login'))
+        return redirect(url_for('.admin_login'))
     except Exception as e:
         logger.error(f"Error during logout: {str(e)}")
         flash('Error during logout.', 'error')
-    return redirect(url_for('admin_login'))
+    return redirect(url_for('.admin_login'))
 
-@app.route('/admin/dashboard')
+@bp.route('/admin/dashboard')
 def admin_dashboard():
     try:
         if not session.get('admin_authenticated'):
             flash('Please login to access the admin dashboard.', 'error')
-            app.logger.warning("Unauthorized access attempt to admin dashboard")
-            return redirect(url_for('admin_login'))
+            current_app.logger.warning("Unauthorized access attempt to admin dashboard")
+            return redirect(url_for('.admin_login'))
 
         try:
-            claims = WarrantyClaim.query.order_by(WarrantyClaim.created_at.desc()).all()
-            app.logger.info(f"Successfully loaded {len(claims)} claims for admin dashboard")
-            return render_template('admin.html', claims=claims)
+            # Claims are fetched page by page from admin_claims_api, and kept
+            # current by the events after this position (see admin_events)
+            return render_template('admin.html', page_size=CLAIMS_PAGE_SIZE, events_since=current_events_position())
         except Exception as e:
-            app.logger.error(f"Database error in admin dashboard: {str(e)}")
-            app.logger.error(traceback.format_exc())
+            current_app.logger.error(f"Database error in admin dashboard: {str(e)}")
+            current_app.logger.error(traceback.format_exc())
             flash('Error loading claims data. Please try again.', 'error')
-            return redirect(url_for('admin_login'))
+            return redirect(url_for('.admin_login'))
             
     except Exception as e:
-        app.logger.error(f"Error in admin dashboard: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        current_app.logger.error(f"Error in admin dashboard: {str(e)}")
+        current_app.logger.error(traceback.format_exc())
         flash('An unexpected error occurred. Please try again.', 'error')
-        return redirect(url_for('admin_login'))
+        return redirect(url_for('.admin_login'))
+
+def current_events_position():
+    try:
+        return dashboard_events.last_id()
+    except Exception as e:
+        logger.warning(f"Dashboard event log unavailable: {str(e)}")
+        return None
+
+@bp.route('/admin/api/events')
+def admin_events():
+    """Claim changes for open dashboards, as Server-Sent Events"""
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    # A reconnecting EventSource sends the id of the last event it received
+    after = request.headers.get('Last-Event-ID') or request.args.get('since')
+    # The stream only reads the event log, never the database
+    db.session.close()
+    stream = event_stream(after, current_app.config['EVENT_STREAM_SECONDS'], current_app.config['EVENT_RETRY_SECONDS'])
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stops nginx from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
+
+@bp.route('/admin/api/claims')
+@read_replica
+def admin_claims_api():
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    statuses = [value for value in request.args.get('status', '').split(',') if value and value != 'all']
+    if any(value not in CLAIM_STATUSES for value in statuses):
+        return jsonify({'error': 'Invalid status filter'}), 400
+
+    limit = request.args.get('limit', CLAIMS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, CLAIMS_MAX_PAGE_SIZE))
+    search = request.args.get('q', '').strip()
+
+    try:
+        query = filter_claims(WarrantyClaim.query, statuses, search)
+        claims, next_cursor = paginate_claims(query, request.args.get('cursor'), limit)
+    except (ValueError, UnicodeDecodeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    except Exception as e:
+        logger.error(f"Error listing claims: {str(e)}")
+        return jsonify({'error': 'Failed to load claims'}), 500
+
+    return jsonify({
+        'claims': [claim.to_summary_dict() for claim in claims],
+        'next_cursor': next_cursor
+    })
 
-@app.route('/admin/view/<int:claim_id>')
+def import_token_valid():
+    token = current_app.config['IMPORT_API_TOKEN']
+    header = request.headers.get('Authorization', '')
+    if not token or not header.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(header[len('Bearer '):].encode(), token.encode())
+
+@bp.route('/admin/api/claims/import', methods=['POST'])
+def import_claims_api():
+    if not (session.get('admin_authenticated') or import_token_valid()):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    fmt = request.args.get('format') or ('jsonl' if request.mimetype in ('application/x-ndjson', 'application/jsonl') else 'csv')
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(IMPORT_FORMATS)}'}), 400
+    start_row = request.args.get('start_row', 0, type=int)
+
+    max_size = current_app.config['IMPORT_MAX_SIZE']
+    if (request.content_length or 0) > max_size:
+        return jsonify({'error': f'Import files are limited to {max_size} bytes'}), 413
+
+    # Read the raw body as a stream (not request.data), under its own size limit
+    body = get_input_stream(request.environ, max_content_length=max_size)
+    try:
+        result, rejects = import_stream(body, fmt, start_row, gzipped=request.content_encoding == 'gzip')
+    except ImportFailed as e:
+        logger.error(f"Claim import failed: {str(e.__cause__ or e.__context__)}")
+        return jsonify({
+            'error': f'Import stopped after row {e.result.last_row}; retry with start_row={e.result.last_row}',
+            **e.result.to_dict(),
+            'rejected_rows': e.rejects
+        }), 500
+
+    logger.info(f"Imported {result.inserted} claims via API ({result.skipped} skipped, {result.rejected} rejected)")
+    return jsonify({**result.to_dict(), 'rejected_rows': rejects})
+
+@bp.route('/admin/api/claims/search')
+@read_replica
+def admin_search_api():
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    search = request.args.get('q', '').strip()
+    if not search:
+        return jsonify({'error': 'Missing search query'}), 400
+
+    statuses = [value for value in request.args.get('status', '').split(',') if value and value != 'all']
+    if any(value not in CLAIM_STATUSES for value in statuses):
+        return jsonify({'error': 'Invalid status filter'}), 400
+
+    limit = request.args.get('limit', CLAIMS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, CLAIMS_MAX_PAGE_SIZE))
+
+    try:
+        query = filter_claims(WarrantyClaim.query, statuses)
+        claims, next_cursor = search_claims(query, search, request.args.get('cursor'), limit)
+    except (ValueError, UnicodeDecodeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    except Exception as e:
+        logger.error(f"Error searching claims: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
+
+    return jsonify({
+        'claims': [claim.to_summary_dict() for claim in claims],
+        'next_cursor': next_cursor
+    })
+
+@bp.route('/admin/api/claims/counts')
+@read_replica
+def admin_claim_counts():
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        return jsonify(claim_status_counts())
+    except Exception as e:
+        logger.error(f"Error counting claims: {str(e)}")
+        return jsonify({'error': 'Failed to load claim counts'}), 500
+
+@bp.route('/admin/api/analytics')
+@read_replica
+def admin_analytics_api():
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    period = request.args.get('period', 'week')
+    dimension = request.args.get('dimension', 'all')
+    if period not in PERIODS:
+        return jsonify({'error': f'period must be one of {", ".join(PERIODS)}'}), 400
+    if dimension not in DIMENSIONS:
+        return jsonify({'error': f'dimension must be one of {", ".join(DIMENSIONS)}'}), 400
+
+    try:
+        date_from = parse_date(request.args['from']) if request.args.get('from') else None
+        date_to = parse_date(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Please use YYYY-MM-DD format.'}), 400
+    first, last = bucket_range(period, date_from, date_to)
+    if first > last or bucket_count(period, first, last) > MAX_BUCKETS:
+        return jsonify({'error': f'Choose a range of at most {MAX_BUCKETS} {period}s'}), 400
+
+    limit = max(1, min(request.args.get('limit', TOP_VALUES, type=int), 50))
+
+    try:
+        return jsonify(claim_analytics(period, dimension, first, last, limit))
+    except Exception as e:
+        logger.error(f"Error loading claim analytics: {str(e)}")
+        return jsonify({'error': 'Failed to load analytics'}), 500
+
+@bp.route('/admin/view/<int:claim_id>')
+@read_replica
 def view_claim(claim_id):
     if not session.get('admin_authenticated'):
         return jsonify({'error': 'Unauthorized'}), 401
 
     try:
-        claim = WarrantyClaim.query.get_or_404(claim_id)
-        return jsonify(claim.to_dict())
+        payload = claim_cache.get_or_load(claim_key(claim_id), lambda: load_claim_payload(claim_id))
+        if payload is None:
+            return jsonify({'error': 'Claim not found'}), 404
+        return jsonify(payload)
     except Exception as e:
         logger.error(f"Error viewing claim: {str(e)}")
         return jsonify({'error': 'Failed to load claim details'}), 500
 
-@app.route('/admin/download/<int:claim_id>')
+@bp.route('/admin/download/<int:claim_id>')
 def download_file(claim_id):
     try:
         if not session.get('admin_authenticated'):
             logger.warning(f"Unauthorized attempt to download file for claim {claim_id}")
             return "Unauthorized access", 401
 
-        claim = WarrantyClaim.query.get(claim_id)
+        claim = WarrantyClaim.query.get(claim_id) or find_archived_claim(claim_id)
         if not claim or not claim.file_path:
             logger.error(f"File not found for claim: {claim_id}")
             return "File not found", 404
 
-        if not os.path.exists(claim.file_path):
+        download_name = claim.file_name or os.path.basename(claim.file_path)
+
+        if isinstance(claim, ArchivedClaim) and current_app.extensions['archive_storage'].exists(claim.file_path):
+            logger.info(f"Downloading archived file for claim ID: {claim_id}")
+            return send_stored_file(claim.file_path, download_name, archived=True)
+
+        if current_app.extensions['storage'].exists(claim.file_path):
+            logger.info(f"Downloading file for claim ID: {claim_id}")
+            return send_stored_file(claim.file_path, download_name)
+
+        # Claims submitted before content-addressed storage hold a plain file path
+        if not os.path.isfile(claim.file_path):
             logger.error(f"Physical file missing for claim {claim_id}: {claim.file_path}")
             return "File not found", 404
 
-        logger.info(f"Downloading file for claim ID: {claim_id}")
-        return send_file(
-            claim.file_path,
-            as_attachment=True,
-            download_name=os.path.basename(claim.file_path)
-        )
+        logger.info(f"Downloading legacy file for claim ID: {claim_id}")
+        path = os.path.abspath(claim.file_path)
+        upload_root = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+        x_accel_path = None
+        if os.path.commonpath([path, upload_root]) == upload_root:
+            x_accel_path = os.path.relpath(path, upload_root)
+        # Legacy paths are not content hashes, so the ETag comes from the file's mtime and size
+        return send_local_file(path, download_name, x_accel_path=x_accel_path)
 
     except Exception as e:
         logger.error(f"Error downloading file for claim {claim_id}: {str(e)}")
         logger.error(traceback.format_exc())
         return "Error downloading file", 500
 
-@app.route('/authorized/management/admin/approve/<int:claim_id>', methods=['POST'])
+@bp.route('/admin/thumbnail/<int:claim_id>')
+def claim_thumbnail(claim_id):
+    if not session.get('admin_authenticated'):
+        return "Unauthorized access", 401
+
+    try:
+        claim = db.session.get(WarrantyClaim, claim_id) or find_archived_claim(claim_id)
+        if not claim or not claim.thumbnail_path:
+            return "Thumbnail not found", 404
+        archived = isinstance(claim, ArchivedClaim) and current_app.extensions['archive_storage'].exists(claim.thumbnail_path)
+        return send_stored_file(claim.thumbnail_path, f'{claim.reference_number}-thumbnail.jpg', archived=archived)
+    except Exception as e:
+        logger.error(f"Error sending thumbnail for claim {claim_id}: {str(e)}")
+        return "Error loading thumbnail", 500
+
+@bp.route('/authorized/management/admin/approve/<int:claim_id>', methods=['POST'])
 def approve_claim(claim_id):
     if not session.get('admin_authenticated'):
-        app.logger.warning(f'Unauthorized attempt to approve claim {claim_id}')
+        current_app.logger.warning(f'Unauthorized attempt to approve claim {claim_id}')
         return jsonify({'success': False, 'error': 'Unauthorized access'}), 401
-    
+
     try:
-        claim = WarrantyClaim.query.get_or_404(claim_id)
-        if claim.status != 'pending':
-            return jsonify({
-                'success': False, 
-                'error': f'Cannot approve claim that is already {claim.status}'
-            }), 400
-            
-        claim.status = 'approved'
-        db.session.commit()
-        
-        app.logger.info(f'Claim {claim_id} approved successfully')
-        return jsonify({
-            'success': True,
-            'message': f'Claim {claim.reference_number} has been approved'
-        })
-        
+        return transition_claim(claim_id, 'approve')
+
+    except HTTPException:
+        raise
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f'Error approving claim {claim_id}: {str(e)}')
+        current_app.logger.error(f'Error approving claim {claim_id}: {str(e)}')
         return jsonify({
             'success': False,
             'error': 'An error occurred while approving the claim'
         }), 500
 
-@app.route('/authorized/management/admin/reject/<int:claim_id>', methods=['POST'])
+@bp.route('/authorized/management/admin/reject/<int:claim_id>', methods=['POST'])
 def reject_claim(claim_id):
     if not session.get('admin_authenticated'):
-        app.logger.warning(f'Unauthorized attempt to reject claim {claim_id}')
+        current_app.logger.warning(f'Unauthorized attempt to reject claim {claim_id}')
         return jsonify({'success': False, 'error': 'Unauthorized access'}), 401
-    
+
     try:
-        claim = WarrantyClaim.query.get_or_404(claim_id)
-        if claim.status != 'pending':
-            return jsonify({
-                'success': False, 
-                'error': f'Cannot reject claim that is already {claim.status}'
-            }), 400
-            
-        claim.status = 'rejected'
-        db.session.commit()
-        
-        app.logger.info(f'Claim {claim_id} rejected successfully')
-        return jsonify({
-            'success': True,
-            'message': f'Claim {claim.reference_number} has been rejected'
-        })
-        
+        return transition_claim(claim_id, 'reject')
+
+    except HTTPException:
+        raise
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f'Error rejecting claim {claim_id}: {str(e)}')
+        current_app.logger.error(f'Error rejecting claim {claim_id}: {str(e)}')
         return jsonify({
             'success': False,
             'error': 'An error occurred while rejecting the claim'
         }), 500
 
-@app.route('/authorized/management/admin/export')
+@bp.route('/authorized/management/admin/bulk-status', methods=['POST'])
+def bulk_update_status():
+    if not session.get('admin_authenticated'):
+        current_app.logger.warning('Unauthorized attempt to bulk update claims')
+        return jsonify({'success': False, 'error': 'Unauthorized access'}), 401
+
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action not in STATUS_ACTIONS:
+        return jsonify({'success': False, 'error': 'Action must be approve or reject'}), 400
+
+    ids = data.get('ids')
+    search = ((data.get('filter') or {}).get('q') or '').strip()
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return jsonify({'success': False, 'error': 'ids must be a list of claim ids'}), 400
+        if len(ids) > BULK_MAX_IDS:
+            return jsonify({'success': False, 'error': f'At most {BULK_MAX_IDS} ids per request'}), 400
+        conditions = [WarrantyClaim.id.in_(ids)]
+    elif search:
+        if not search_terms(search):
+            return jsonify({'success': False, 'error': 'The filter has no letters or digits to search for'}), 400
+        conditions = claim_filters(search=search)
+    else:
+        conditions = []
+    if not conditions:
+        # Without a condition the update would move every pending claim
+        return jsonify({'success': False, 'error': 'Provide ids or a filter'}), 400
+
+    new_status = STATUS_ACTIONS[action]
+    try:
+        changed = transition_claims(new_status, conditions)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error in bulk {action}: {str(e)}')
+        return jsonify({'success': False, 'error': 'An error occurred while updating claims'}), 500
+
+    current_app.logger.info(f'Bulk {action}: {len(changed)} claims {new_status}')
+    response = {'success': True, 'updated': len(changed), 'updated_ids': changed}
+
+    if ids is not None:
+        # Explain why the remaining ids were not changed
+        changed_set = set(changed)
+        current = dict(db.session.query(WarrantyClaim.id, WarrantyClaim.status).filter(
+            WarrantyClaim.id.in_([i for i in ids if i not in changed_set])
+        ).all())
+        response['results'] = {
+            str(i): new_status if i in changed_set else (
+                f'already {current[i]}' if i in current else 'not found'
+            )
+            for i in ids
+        }
+
+    return jsonify(response)
+
+@bp.route('/authorized/management/admin/export')
+@read_replica
 def export_csv():
     # Check if user is authenticated
     if not session.get('admin_authenticated'):
-        return redirect(url_for('admin_login'))
+        return redirect(url_for('.admin_login'))
 
-    claims = WarrantyClaim.query.all()
-    csv_data = "Reference Number,Name,Email,Phone,Product,Defect Reason,Warranty Option,Created At\n"
-    
-    for claim in claims:
-        csv_data += f"{claim.reference_number},{claim.name},{claim.email},{claim.phone},{claim.product},{claim.defect_reason},{claim.warranty_option},{claim.created_at}\n"
+    requested = [c for c in request.args.get('columns', '').split(',') if c]
+    columns = requested or DEFAULT_EXPORT_COLUMNS
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        return jsonify({'error': f'Unknown export columns: {", ".join(unknown)}'}), 400
+
+    statuses = [value for value in request.args.get('status', '').split(',') if value and value != 'all']
+    if any(value not in CLAIM_STATUSES for value in statuses):
+        return jsonify({'error': 'Invalid status filter'}), 400
+
+    try:
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+        date_to = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Please use YYYY-MM-DD format.'}), 400
+
+    query = db.session.query(*[getattr(WarrantyClaim, c) for c in columns])
+    query = filter_claims(query, statuses)
+    if date_from:
+        query = query.filter(WarrantyClaim.created_at >= date_from)
+    if date_to:
+        query = query.filter(WarrantyClaim.created_at < date_to)
+    query = query.order_by(WarrantyClaim.id).yield_per(EXPORT_BATCH_SIZE)
 
+    rows = generate_csv(query, [EXPORT_COLUMNS[c] for c in columns])
+    filename = "warranty_claims.csv"
+    mimetype = "text/csv"
+    if request.args.get('gzip') in ('1', 'true'):
+        rows = gzip_stream(rows)
+        filename += ".gz"
+        mimetype = "application/gzip"
+
+    logger.info(f"Streaming claims export ({', '.join(columns)})")
     return Response(
-        csv_data,
-        mimetype="text/csv",
-        headers={"Content-disposition": "attachment; filename=warranty_claims.csv"}
+        stream_with_context(rows),
+        mimetype=mimetype,
+        headers={"Content-disposition": f"attachment; filename={filename}"}
     )
 
-@app.route('/test-email-template')
+@bp.route('/test-email-template')
 def test_email_template():
     # Sample data for testing
     test_data = {
@@ -448,30 +1110,53 @@ def test_email_template():
         claim_details=test_data['claim_details']
     )
 
-@app.route('/warranty-claim', methods=['GET', 'POST'])
+@bp.route('/warranty-claim', methods=['GET', 'POST'])
 def warranty_claim():
     if request.method == 'POST':
         try:
+            idempotency_key = submission_key(request.form.get('email'))
+            replayed = find_submission(idempotency_key)
+            if replayed is not None:
+                logger.info(f"Replaying submission {idempotency_key} for claim {replayed.reference_number}")
+                return replay_submission(replayed)
+
             # Get form data
             name = request.form['name']
-            email = request.form['email']
+            email = normalize_email(request.form['email'])
             phone = request.form['phone']
             product = request.form['product']
             purchase_date = request.form['purchase_date']
             issue = request.form['issue']
             defect_reason = request.form['defect_reason']
             warranty_option = request.form['warranty_option']
-            
-            # Handle file upload
+
+            simhash = issue_simhash(issue)
             file = request.files.get('proof_file')
+            fields = {
+                'name': name,
+                'email': email,
+                'phone': phone,
+                'product': product,
+                'purchase_date': purchase_date,
+                'issue': issue,
+                'defect_reason': defect_reason,
+                'warranty_option': warranty_option
+            }
+            existing, duplicate_of = check_existing_submission(fields, simhash, bool(file and file.filename))
+            if existing is not None:
+                return replay_submission(existing, REPEATED_NOTICE)
+
+            # Handle file upload
             file_path = None
+            file_name = None
             if file and file.filename:
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
+                file_path = save_upload(file)
+                file_name = secure_filename(file.filename)
 
             # Create warranty claim
+            reference_number = generate_reference_number()
             claim = WarrantyClaim(
+                reference_number=reference_number,
                 name=name,
                 email=email,
                 phone=phone,
@@ -480,47 +1165,72 @@ def warranty_claim():
                 issue=issue,
                 defect_reason=defect_reason,
                 warranty_option=warranty_option,
-                file_path=file_path
+                file_path=file_path,
+                file_name=file_name,
+                idempotency_key=idempotency_key,
+                issue_simhash=simhash,
+                duplicate_of_id=duplicate_of.id if duplicate_of else None
             )
-            
+
             db.session.add(claim)
             db.session.commit()
+            enqueue_post_submission(claim)
 
-            # Generate reference number
-            reference_number = f"WC{claim.id:06d}"
-            claim.reference_number = reference_number
-            db.session.commit()
+            session['reference_number'] = reference_number
+            session['claim_id'] = claim.id
 
-            return redirect(url_for('confirmation', reference=reference_number))
+            return redirect(url_for('.confirmation', reference=reference_number))
+
+        except IntegrityError:
+            db.session.rollback()
+            replayed = find_submission(idempotency_key)
+            if replayed is not None:
+                return replay_submission(replayed)
+            logger.error(f"Error processing warranty claim: {traceback.format_exc()}")
+            flash('An error occurred while processing your claim. Please try again.', 'error')
+            return redirect(url_for('.warranty_claim'))
 
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error processing warranty claim: {str(e)}")
             flash('An error occurred while processing your claim. Please try again.', 'error')
-            return redirect(url_for('warranty_claim'))
+            return redirect(url_for('.warranty_claim'))
 
-    return render_template('index.html')
+    return render_claim_form()
 
-@app.route('/health')
+@bp.route('/health')
 def health_check():
     try:
-        # Test database connection
-        db.session.execute('SELECT 1')
+        # The primary; replicas are optional and reported separately
+        db.session.execute(select(1))
         return jsonify({
             'status': 'healthy',
             'database': 'connected',
-            'redis': 'connected' if app.config['SESSION_TYPE'] == 'redis' else 'filesystem'
+            'redis': 'configured' if current_app.extensions['redis'] is not None else 'not configured',
+            'replicas': current_app.extensions['replicas'].status()
         }), 200
     except Exception as e:
-        app.logger.error(f"Health check failed: {str(e)}")
+        current_app.logger.error(f"Health check failed: {str(e)}")
         return jsonify({
             'status': 'unhealthy',
             'error': str(e)
         }), 500
 
-# Serve static files
-@app.route('/static/<path:filename>')
-def serve_static(filename):
-    return send_from_directory(app.static_folder, filename)
+@bp.route('/health/pool')
+def pool_health():
+    # Counters are per process: each gunicorn worker reports its own pool
+    try:
+        return jsonify(pool_stats(db.engine)), 200
+    except Exception as e:
+        current_app.logger.error(f"Pool stats failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/health/cache')
+def cache_health():
+    # Hit/miss counters are per process; /metrics has them for all workers
+    return jsonify(claim_cache.stats()), 200
 
 if __name__ == '__main__':
+    app = create_app()
+    init_database(app)
     app.run(host='127.0.0.1', port=5001, debug=True)
\ No newline at end of file
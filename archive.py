@@ -0,0 +1,117 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import aliased
+
+from importer import claims_cli
+from models import db, ArchivedClaim, WarrantyClaim
+from uploads import schedule_removal
+
+logger = logging.getLogger(__name__)
+
+# Claims approved or rejected more than ARCHIVE_AFTER_DAYS ago are moved,
+# batch by batch, from warranty_claims to archived_claims. Their uploads
+# move from the upload storage to the archive storage. Each batch:
+# 1. copies the batch's files to the archive storage
+# 2. inserts the archive rows and deletes the claims in one transaction
+# 3. queues the hot copies for deletion, which happens after a grace period
+#    and only if no remaining claim uses them (see uploads.schedule_removal)
+# A crash between steps only leaves a spare copy of a file, never a claim
+# without its file. Archived claims are still served by the claim view,
+# download and thumbnail routes, and counted by the analytics rollups.
+
+ARCHIVE_BATCH_SIZE = 500
+CLOSED_STATUSES = ('approved', 'rejected')
+
+
+def archive_candidates(cutoff, batch_size):
+    """Closed claims decided before cutoff, oldest first"""
+    duplicate = aliased(WarrantyClaim)
+    newest_id = db.session.scalar(select(func.max(WarrantyClaim.id)))
+    if newest_id is None:
+        return []
+    return WarrantyClaim.query.filter(
+        WarrantyClaim.status.in_(CLOSED_STATUSES),
+        WarrantyClaim.updated_at < cutoff,
+        # SQLite reuses the highest id once that row is deleted, which would
+        # give a new claim the id of an archived one
+        WarrantyClaim.id < newest_id,
+        # Kept while a live claim is marked as its duplicate (the foreign key)
+        ~select(duplicate.id).where(duplicate.duplicate_of_id == WarrantyClaim.id).exists()
+    ).order_by(WarrantyClaim.id).limit(batch_size).all()
+
+
+def upload_keys(claim):
+    return [key for key in (claim.file_path, claim.thumbnail_path) if key]
+
+
+def copy_to_archive(storage, archive_storage, key):
+    """Copy an upload to the archive storage; False if it is not in the upload storage"""
+    if not storage.exists(key):
+        return False
+    if not archive_storage.exists(key):
+        source = storage.open(key)
+        try:
+            # Keys are content hashes, so the copy gets the same key
+            archive_storage.save(source, key)
+        finally:
+            source.close()
+    return True
+
+
+def archive_batch(claims, storage, archive_storage):
+    """Move one batch of claims and their uploads to the archive"""
+    moved = set()
+    for claim in claims:
+        for key in upload_keys(claim):
+            # Paths from before content-addressed storage are left where they are
+            if copy_to_archive(storage, archive_storage, key):
+                moved.add(key)
+
+    archived_at = datetime.utcnow()
+    db.session.add_all([ArchivedClaim.from_claim(claim, archived_at) for claim in claims])
+    db.session.execute(
+        delete(WarrantyClaim).where(WarrantyClaim.id.in_([claim.id for claim in claims])),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+
+    schedule_removal(sorted(moved))
+
+
+def archive_closed_claims(days, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive claims closed more than `days` ago; returns the number archived"""
+    storage = current_app.extensions['storage']
+    archive_storage = current_app.extensions['archive_storage']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    archived = 0
+    while True:
+        claims = archive_candidates(cutoff, batch_size)
+        if not claims:
+            return archived
+        archive_batch(claims, storage, archive_storage)
+        archived += len(claims)
+        db.session.expunge_all()
+        logger.info(f"Archived {archived} claims so far")
+
+
+def find_archived_claim(claim_id):
+    return db.session.get(ArchivedClaim, claim_id)
+
+
+@claims_cli.command('archive')
+@click.option('--days', type=int, help='Archive claims closed more than this many days ago. Default: ARCHIVE_AFTER_DAYS')
+@click.option('--batch-size', default=ARCHIVE_BATCH_SIZE, show_default=True)
+@with_appcontext
+def archive_command(days, batch_size):
+    """Move long-closed claims and their uploads to the archive (run it daily, e.g. from cron)."""
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    started = time.perf_counter()
+    archived = archive_closed_claims(days, batch_size)
+    click.echo(f"Archived {archived} claims closed more than {days} days ago in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup, with_appcontext
+
+try:
+    import brotli
+except ImportError:  # optional: `pip install brotli` to also emit .br files
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:  # optional: without it scripts are fingerprinted and compressed, not minified
+    rjsmin = None
+
+logger = logging.getLogger(__name__)
+
+# `flask assets build` writes minified, content-hashed copies of everything
+# under static/ to static/dist, each with .gz (and .br) siblings, plus a
+# manifest mapping source paths to built ones. Built files never change
+# under a given name, so browsers may cache them for a year. Scripts are
+# only minified when rjsmin is installed.
+
+BUILD_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Strings and comments first, so their contents are never touched
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)', re.S)
+
+
+def minify_css(source):
+    """Strip comments and insignificant whitespace from a stylesheet"""
+    out = []
+    pending = []
+    position = 0
+    for match in CSS_TOKENS.finditer(source):
+        pending.append(source[position:match.start()])
+        if match.group(1):
+            out.append(compact_css(''.join(pending)))
+            out.append(match.group(1))
+            pending = []
+        position = match.end()
+    pending.append(source[position:])
+    out.append(compact_css(''.join(pending)))
+    return ''.join(out).strip()
+
+
+def compact_css(chunk):
+    chunk = re.sub(r'\s+', ' ', chunk)
+    chunk = re.sub(r' ?([{};,>]) ?', r'\1', chunk)
+    return chunk.replace(';}', '}')
+
+
+MINIFIERS = {'.css': minify_css}
+if rjsmin is not None:
+    MINIFIERS['.js'] = rjsmin.jsmin
+
+
+def fingerprint(path, content):
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest}{ext}"
+
+
+def write_compressed(path, content):
+    # mtime=0 keeps builds reproducible: same input, same bytes
+    gzipped = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(gzipped) < len(content):
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzipped)
+    if brotli is not None:
+        compressed = brotli.compress(content, quality=11)
+        if len(compressed) < len(content):
+            with open(path + '.br', 'wb') as f:
+                f.write(compressed)
+
+
+def build_assets(static_folder):
+    """Build static/dist and its manifest; returns the manifest"""
+    build_root = os.path.join(static_folder, BUILD_DIR)
+    shutil.rmtree(build_root, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder) and BUILD_DIR in dirs:
+            dirs.remove(BUILD_DIR)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            ext = os.path.splitext(name)[1].lower()
+
+            with open(source, 'rb') as f:
+                content = f.read()
+            if ext in MINIFIERS:
+                content = MINIFIERS[ext](content.decode('utf-8')).encode('utf-8')
+
+            built = fingerprint(logical, content)
+            target = os.path.join(build_root, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+            if ext in COMPRESSIBLE:
+                write_compressed(target, content)
+            manifest[logical] = f"{BUILD_DIR}/{built}"
+
+    with open(os.path.join(build_root, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning("No static asset manifest, serving unbuilt assets (run `flask assets build`)")
+        return {}
+
+
+def asset_url(filename):
+    """url_for('static') that points at the fingerprinted build when there is one"""
+    built = current_app.extensions['asset_manifest'].get(filename)
+    return url_for('static', filename=built or filename)
+
+
+def serve_static(filename):
+    """Static files; built assets come precompressed with immutable caching"""
+    static_folder = current_app.static_folder
+    if not filename.startswith(BUILD_DIR + '/'):
+        return send_from_directory(static_folder, filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encodings = request.accept_encodings
+    path = os.path.join(static_folder, filename)
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encodings.quality(encoding) > 0 and os.path.isfile(path + suffix):
+            response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(static_folder, filename, mimetype=mimetype)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+assets_cli = AppGroup('assets', help='Static asset pipeline.')
+
+
+@assets_cli.command('build')
+@with_appcontext
+def build_command():
+    """Minify, fingerprint and precompress static files."""
+    manifest = build_assets(current_app.static_folder)
+    current_app.extensions['asset_manifest'] = manifest
+    click.echo(f"Built {len(manifest)} assets into static/{BUILD_DIR}"
+               + ("" if brotli is not None else " (gzip only; install brotli for .br)"))
+
+
+def init_assets(app):
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    # Replace the view behind Flask's own /static rule, so url_for('static')
+    # keeps working everywhere
+    app.view_functions['static'] = serve_static
+    app.add_template_global(asset_url)
+    app.cli.add_command(assets_cli)
@@ -0,0 +1,597 @@
+"""Load-testing and benchmark harness for the warranty claims app.
+
+Seed a database, then drive a running server (gunicorn, waitress or the
+dev server) at a fixed concurrency:
+
+    DATABASE_URL=sqlite:///bench.db python benchmark.py seed --count 100000
+    DATABASE_URL=sqlite:///bench.db ADMIN_USERNAME=admin ADMIN_PASSWORD=secret \\
+        gunicorn --config gunicorn_config.py wsgi:app
+    python benchmark.py run --url http://localhost:10000 --username admin \\
+        --password secret --concurrency 8 --duration 30 --pid <gunicorn master pid> \\
+        --save benchmarks/sync-2x1.json
+
+Compare a later run against a saved baseline with --compare; the command
+exits non-zero when p95 latency or throughput regress beyond --tolerance.
+Add --slow-uploads N to keep N slow-link uploads in flight during the run,
+e.g. to compare WORKER_CLASS=sync against WORKER_CLASS=gevent.
+
+Measure worker cold start (import, create_app and the first request) in
+fresh interpreters, with the slowest imports and any database statements
+issued before the first request:
+
+    DATABASE_URL=sqlite:///bench.db python benchmark.py startup --budget-ms 600
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.cookiejar import CookieJar
+from urllib import error, parse, request
+
+SCENARIOS = ['submit', 'dashboard', 'claims_api', 'view', 'approve', 'reject', 'export']
+PRODUCTS = ['Laptop', 'Phone', 'Tablet', 'Headphones', 'Monitor', 'Keyboard']
+DEFECT_REASONS = ['manufacturing', 'damaged', 'not_working', 'other']
+WARRANTY_OPTIONS = ['repair', 'replacement', 'refund']
+
+
+# Seeding
+
+def seed(count, batch_size):
+    """Insert `count` synthetic claims with batched executemany inserts"""
+    from sqlalchemy import insert
+    from analytics import record_created
+    from app import create_app, init_database
+    from models import db, WarrantyClaim
+
+    run_id = uuid.uuid4().hex[:6].upper()
+    start = datetime.utcnow() - timedelta(days=365)
+    app = create_app()
+    init_database(app)
+    with app.app_context():
+        began = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            rows = []
+            for i in range(offset, min(offset + batch_size, count)):
+                created_at = start + timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+                status = random.choice(['pending', 'pending', 'approved', 'rejected'])
+                decided_at = None
+                if status != 'pending':
+                    decided_at = min(created_at + timedelta(hours=random.randint(1, 240)), datetime.utcnow())
+                rows.append({
+                    'reference_number': f'BENCH-{run_id}-{i:07d}',
+                    'name': f'Customer {i}',
+                    'email': f'customer{i}@example.com',
+                    'phone': f'555{i:07d}',
+                    'product': random.choice(PRODUCTS),
+                    'purchase_date': (created_at - timedelta(days=random.randint(1, 700))).strftime('%Y-%m-%d'),
+                    'issue': 'Device stops working after a few minutes of use. ' * random.randint(1, 5),
+                    'defect_reason': random.choice(DEFECT_REASONS),
+                    'warranty_option': random.choice(WARRANTY_OPTIONS),
+                    'status': status,
+                    'created_at': created_at,
+                    'updated_at': decided_at
+                })
+            db.session.execute(insert(WarrantyClaim), rows)
+            # Core inserts skip the ORM flush that keeps the analytics rollups current
+            record_created(db.session, rows)
+            db.session.commit()
+            print(f'  seeded {min(offset + batch_size, count)}/{count}', file=sys.stderr)
+        print(f'Seeded {count} claims in {time.perf_counter() - began:.1f}s')
+
+
+# Submissions
+
+ISSUE_WORDS = ['screen', 'battery', 'flickers', 'overheats', 'crackles', 'hinge', 'port', 'loose',
+               'charging', 'stops', 'drains', 'fast', 'randomly', 'restarts', 'button', 'stuck']
+
+
+def unique_email(prefix):
+    # A repeated customer, product and issue is folded into the earlier
+    # claim by the duplicate check, which would skip the insert being measured
+    return f'{prefix}-{uuid.uuid4().hex[:12]}@example.com'
+
+
+def random_issue():
+    return ' '.join(random.choice(ISSUE_WORDS) for _ in range(12))
+
+
+# HTTP client
+
+class NoRedirect(request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def build_opener():
+    return request.build_opener(request.HTTPCookieProcessor(CookieJar()), NoRedirect())
+
+
+def encode_multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, content, mimetype) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {mimetype}\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def fetch(opener, url, data=None, headers=None):
+    """Send a request and read the whole body; returns the status code"""
+    req = request.Request(url, data=data, headers=headers or {}, method='POST' if data is not None else 'GET')
+    try:
+        with opener.open(req, timeout=120) as response:
+            while response.read(64 * 1024):
+                pass
+            return response.status
+    except error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def login(opener, base_url, username, password):
+    data = parse.urlencode({'username': username, 'password': password}).encode()
+    fetch(opener, f'{base_url}/admin/login', data=data)
+    status = fetch(opener, f'{base_url}/admin/api/claims?limit=1')
+    if status != 200:
+        raise SystemExit(f'Admin login failed (status {status}); check --username/--password')
+
+
+def claim_ids(opener, base_url, status=None, limit=200):
+    """Collect up to `limit` claim ids through the paginated claims API"""
+    ids = []
+    query = {'limit': min(limit, 200)}
+    if status:
+        query['status'] = status
+    while len(ids) < limit:
+        with opener.open(f'{base_url}/admin/api/claims?{parse.urlencode(query)}') as response:
+            page = json.load(response)
+        ids.extend(claim['id'] for claim in page['claims'])
+        if not page['next_cursor']:
+            break
+        query['cursor'] = page['next_cursor']
+    return ids[:limit]
+
+
+class Scenarios:
+    """One request per call for each benchmarked path"""
+
+    def __init__(self, base_url, upload_size, pending_ids, all_ids):
+        self.base_url = base_url
+        self.upload = os.urandom(upload_size)
+        self.pending_ids = pending_ids
+        self.all_ids = all_ids
+        self.lock = threading.Lock()
+
+    def submit(self, opener):
+        body, content_type = encode_multipart({
+            'name': 'Bench Customer',
+            'email': unique_email('bench'),
+            'phone': '5550000000',
+            'product': random.choice(PRODUCTS),
+            'purchase_date': '2024-01-15',
+            'issue': random_issue(),
+            'defect-reason': random.choice(DEFECT_REASONS),
+            'warranty-option': random.choice(WARRANTY_OPTIONS)
+        }, {'supporting_document': ('receipt.pdf', self.upload, 'application/pdf')})
+        return fetch(opener, f'{self.base_url}/submit-claim', data=body, headers={'Content-Type': content_type})
+
+    def dashboard(self, opener):
+        return fetch(opener, f'{self.base_url}/admin/dashboard')
+
+    def claims_api(self, opener):
+        return fetch(opener, f'{self.base_url}/admin/api/claims?limit=50')
+
+    def view(self, opener):
+        return fetch(opener, f'{self.base_url}/admin/view/{random.choice(self.all_ids)}')
+
+    def transition(self, opener, action):
+        # Each pending claim can only be transitioned once
+        with self.lock:
+            if not self.pending_ids:
+                return None
+            claim_id = self.pending_ids.pop()
+        return fetch(opener, f'{self.base_url}/authorized/management/admin/{action}/{claim_id}', data=b'')
+
+    def approve(self, opener):
+        return self.transition(opener, 'approve')
+
+    def reject(self, opener):
+        return self.transition(opener, 'reject')
+
+    def export(self, opener):
+        return fetch(opener, f'{self.base_url}/authorized/management/admin/export')
+
+
+class SlowUploader(threading.Thread):
+    """Keeps posting claims with an upload trickled at `rate` bytes/s, like a poor mobile link"""
+
+    def __init__(self, base_url, scenarios, rate):
+        super().__init__(daemon=True)
+        self.url = parse.urlsplit(base_url)
+        self.scenarios = scenarios
+        self.rate = rate
+        self.stopped = threading.Event()
+
+    def upload_once(self):
+        body, content_type = encode_multipart({
+            'name': 'Slow Customer',
+            'email': unique_email('slow'),
+            'phone': '5550000001',
+            'product': 'Phone',
+            'purchase_date': '2024-01-15',
+            'issue': random_issue(),
+            'defect-reason': 'other',
+            'warranty-option': 'repair'
+        }, {'supporting_document': ('photo.jpg', self.scenarios.upload, 'image/jpeg')})
+
+        conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=300)
+        try:
+            conn.putrequest('POST', '/submit-claim')
+            conn.putheader('Content-Type', content_type)
+            conn.putheader('Content-Length', str(len(body)))
+            conn.endheaders()
+            chunk = max(1, self.rate // 10)
+            for offset in range(0, len(body), chunk):
+                if self.stopped.is_set():
+                    return
+                conn.send(body[offset:offset + chunk])
+                time.sleep(0.1)
+            conn.getresponse().read()
+        finally:
+            conn.close()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.upload_once()
+            except OSError:
+                time.sleep(0.5)
+
+
+# Resource sampling
+
+def process_tree(pid):
+    pids = [pid]
+    for task in os.listdir(f'/proc/{pid}/task'):
+        try:
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                for child in f.read().split():
+                    pids.extend(process_tree(int(child)))
+        except OSError:
+            pass
+    return pids
+
+
+def rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler(threading.Thread):
+    """Samples the total RSS of a server process and its workers (Linux /proc)"""
+
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                total = sum(rss_bytes(p) for p in process_tree(self.pid))
+            except OSError:
+                total = 0
+            self.peak = max(self.peak, total)
+            self.stopped.wait(self.interval)
+
+
+# Cold start
+
+# Runs in a fresh interpreter; prints the timings as JSON on the last line
+STARTUP_SCRIPT = """
+import json, time
+began = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+app = create_app()
+created = time.perf_counter()
+boot_statements = len(statements)
+status = app.test_client().get('/').status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - began) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - began) * 1000,
+    'boot_statements': boot_statements,
+    'status': status
+}))
+"""
+
+
+def import_times(stderr):
+    """Cumulative microseconds per module imported directly by app, from -X importtime"""
+    children = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('| package'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # A module is listed after everything it imported
+        if depth == 1:
+            children[name.strip()] = int(cumulative)
+        elif depth == 0:
+            if name.strip() == 'app':
+                return children
+            children = {}
+    return {}
+
+
+def startup(args):
+    runs = []
+    imports = {}
+    for _ in range(args.runs):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if process.returncode != 0:
+            raise SystemExit(f'Startup run failed:\n{process.stderr[-2000:]}')
+        runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+        for name, micros in import_times(process.stderr).items():
+            imports.setdefault(name, []).append(micros)
+
+    print(f"Cold start over {args.runs} runs (median ms):")
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms'):
+        print(f"  {key[:-3]:<40}{statistics.median(r[key] for r in runs):>8.1f}")
+    statements = max(r['boot_statements'] for r in runs)
+    print(f"  DB statements before the first request: {statements}")
+
+    print("\nSlowest imports (median ms, -X importtime inflates these):")
+    slowest = sorted(imports.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, micros in slowest[:args.top]:
+        print(f"  {name:<40}{statistics.median(micros) / 1000:>8.1f}")
+
+    failures = []
+    total = statistics.median(r['total_ms'] for r in runs)
+    if args.budget_ms and total > args.budget_ms:
+        failures.append(f"cold start {total:.0f}ms is over the {args.budget_ms}ms budget")
+    if statements:
+        failures.append(f"{statements} database statements ran before the first request")
+    for failure in failures:
+        print(f"\nOver budget: {failure}")
+    return 1 if failures else 0
+
+
+# Running and reporting
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_scenario(name, func, openers, duration, max_requests):
+    latencies = []
+    errors = 0
+    count_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(opener):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            with count_lock:
+                if max_requests and len(latencies) + errors >= max_requests:
+                    return
+            start = time.perf_counter()
+            try:
+                status = func(opener)
+                if status is None:
+                    return  # Scenario ran out of work (no pending claims left)
+                failed = status >= 400
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with count_lock:
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(openers)) as pool:
+        list(pool.map(worker, openers))
+    wall = time.perf_counter() - began
+
+    ms = [value * 1000 for value in latencies]
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0,
+        'p50_ms': round(percentile(ms, 50), 2) if ms else None,
+        'p95_ms': round(percentile(ms, 95), 2) if ms else None,
+        'p99_ms': round(percentile(ms, 99), 2) if ms else None,
+        'mean_ms': round(statistics.mean(ms), 2) if ms else None
+    }
+
+
+def print_report(results, baseline=None):
+    header = f"{'scenario':<12}{'req':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results['scenarios'].items():
+        line = (f"{name:<12}{r['requests']:>8}{r['errors']:>6}{r['throughput_rps']:>10}"
+                f"{str(r['p50_ms']):>10}{str(r['p95_ms']):>10}{str(r['p99_ms']):>10}")
+        old = (baseline or {}).get('scenarios', {}).get(name)
+        if old and old.get('p95_ms') and r['p95_ms']:
+            line += f"   p95 {(r['p95_ms'] / old['p95_ms'] - 1) * 100:+.0f}%"
+            line += f", rps {(r['throughput_rps'] / old['throughput_rps'] - 1) * 100:+.0f}%" if old['throughput_rps'] else ''
+        print(line)
+    if results.get('peak_rss_bytes'):
+        print(f"\nPeak server RSS: {results['peak_rss_bytes'] / 1024 / 1024:.1f} MiB")
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, r in results['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if not old or not r['p95_ms'] or not old.get('p95_ms'):
+            continue
+        if r['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            found.append(f"{name}: p95 {old['p95_ms']}ms -> {r['p95_ms']}ms")
+        if old['throughput_rps'] and r['throughput_rps'] < old['throughput_rps'] * (1 - tolerance):
+            found.append(f"{name}: throughput {old['throughput_rps']} -> {r['throughput_rps']} req/s")
+    return found
+
+
+def run(args):
+    base_url = args.url.rstrip('/')
+    scenarios = args.scenarios.split(',')
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    openers = [build_opener() for _ in range(args.concurrency)]
+    admin_needed = any(s != 'submit' for s in scenarios)
+    if admin_needed:
+        for opener in openers:
+            login(opener, base_url, args.username, args.password)
+
+    all_ids = claim_ids(openers[0], base_url) if admin_needed else []
+    transitions = [s for s in scenarios if s in ('approve', 'reject')]
+    pending_ids = claim_ids(openers[0], base_url, status='pending', limit=args.max_pending) if transitions else []
+    random.shuffle(pending_ids)
+    if admin_needed and not all_ids:
+        raise SystemExit('No claims found; seed the database first')
+    bench = Scenarios(base_url, args.upload_size, pending_ids, all_ids)
+
+    sampler = RssSampler(args.pid) if args.pid else None
+    if sampler:
+        sampler.start()
+
+    slow_uploaders = [SlowUploader(base_url, bench, args.slow_upload_rate) for _ in range(args.slow_uploads)]
+    for uploader in slow_uploaders:
+        uploader.start()
+
+    results = {
+        'url': base_url,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'label': args.label,
+        'slow_uploads': args.slow_uploads,
+        'timestamp': datetime.utcnow().isoformat(),
+        'scenarios': {}
+    }
+    for name in scenarios:
+        print(f'Running {name} ...', file=sys.stderr)
+        results['scenarios'][name] = run_scenario(
+            name, getattr(bench, name), openers, args.duration, args.max_requests
+        )
+
+    for uploader in slow_uploaders:
+        uploader.stopped.set()
+
+    if sampler:
+        sampler.stopped.set()
+        sampler.join()
+        results['peak_rss_bytes'] = sampler.peak
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print_report(results, baseline)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Saved results to {args.save}')
+
+    if baseline:
+        found = regressions(results, baseline, args.tolerance)
+        if found:
+            print('\nRegressions beyond tolerance:')
+            for item in found:
+                print(f'  {item}')
+            return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = sub.add_parser('seed', help='Insert synthetic claims into DATABASE_URL')
+    seed_parser.add_argument('--count', type=int, default=10000)
+    seed_parser.add_argument('--batch-size', type=int, default=5000)
+
+    run_parser = sub.add_parser('run', help='Drive a running server and report latency')
+    run_parser.add_argument('--url', default='http://localhost:10000')
+    run_parser.add_argument('--username', default=os.environ.get('ADMIN_USERNAME'))
+    run_parser.add_argument('--password', default=os.environ.get('ADMIN_PASSWORD'))
+    run_parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    run_parser.add_argument('--concurrency', type=int, default=4)
+    run_parser.add_argument('--duration', type=float, default=10, help='Seconds per scenario')
+    run_parser.add_argument('--max-requests', type=int, default=0, help='Cap requests per scenario')
+    run_parser.add_argument('--max-pending', type=int, default=20000,
+                            help='Pending claims to fetch for the approve/reject scenarios')
+    run_parser.add_argument('--upload-size', type=int, default=512 * 1024, help='Upload size in bytes')
+    run_parser.add_argument('--slow-uploads', type=int, default=0,
+                            help='Background clients trickling uploads while the scenarios run')
+    run_parser.add_argument('--slow-upload-rate', type=int, default=64 * 1024,
+                            help='Upload speed of each slow client, in bytes/s')
+    run_parser.add_argument('--pid', type=int, help='Server master pid, to sample peak RSS')
+    run_parser.add_argument('--label', default='', help='Free-form label saved with the results')
+    run_parser.add_argument('--save', help='Write results as JSON (a baseline)')
+    run_parser.add_argument('--compare', help='Baseline JSON to compare against')
+    run_parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed regression (0.2 = 20%%)')
+
+    startup_parser = sub.add_parser('startup', help='Measure worker cold start in fresh interpreters')
+    startup_parser.add_argument('--runs', type=int, default=5)
+    startup_parser.add_argument('--top', type=int, default=10, help='Slowest imports to list')
+    startup_parser.add_argument('--budget-ms', type=float, default=0,
+                                help='Exit non-zero when the median cold start exceeds this')
+
+    args = parser.parse_args(argv)
+    if args.command == 'seed':
+        seed(args.count, args.batch_size)
+        return 0
+    if args.command == 'startup':
+        return startup(args)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from metrics import CACHE_REQUESTS
+from models import WarrantyClaim
+from replicas import primary_reads
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+# The in-process cache is per worker and other workers never see its
+# invalidations, so its entries live much shorter
+LOCAL_TTL = 30
+STATUS_COUNTS_KEY = 'claims:status_counts'
+
+
+def claim_key(claim_id):
+    return f'claim:{claim_id}'
+
+
+class LocalCache:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [k for k in self.entries if k.startswith(prefix)]:
+                del self.entries[key]
+
+
+class RedisCache:
+    """Cache shared by all workers through Redis"""
+
+    def __init__(self, client, namespace='cache:'):
+        self.client = client
+        self.namespace = namespace
+
+    def get(self, key):
+        return self.client.get(self.namespace + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.namespace + key, value, ex=ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.namespace + key for key in keys])
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=f'{self.namespace}{prefix}*', count=500))
+        if keys:
+            self.client.delete(*keys)
+
+
+class ClaimCache:
+    """Read-through cache for claim payloads and dashboard aggregates"""
+
+    def __init__(self, backend=None, ttl=DEFAULT_TTL):
+        self.backend = backend or LocalCache()
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_REQUESTS.labels('hit' if hit else 'miss').inc()
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss.
+
+        A loader result of None is not cached.
+        """
+        try:
+            raw = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Cache read failed for {key}: {str(e)}")
+            raw = None
+
+        if raw is not None:
+            self.record(hit=True)
+            return json.loads(raw)
+
+        self.record(hit=False)
+        # A stale replica read cached after an invalidation would outlive
+        # the replica's lag by the whole TTL, so cache fills read the primary
+        with primary_reads():
+            value = loader()
+        if value is not None:
+            try:
+                self.backend.set(key, json.dumps(value), self.ttl)
+            except Exception as e:
+                logger.warning(f"Cache write failed for {key}: {str(e)}")
+        return value
+
+    def invalidate(self, claim_ids=(), all_claims=False, aggregates=False):
+        try:
+            if all_claims:
+                self.backend.delete_prefix('claim:')
+            elif claim_ids:
+                self.backend.delete(*[claim_key(claim_id) for claim_id in claim_ids])
+            if aggregates or all_claims or claim_ids:
+                self.backend.delete(STATUS_COUNTS_KEY)
+        except Exception as e:
+            logger.error(f"Cache invalidation failed: {str(e)}")
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'backend': self.backend.__class__.__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else None
+            }
+
+
+claim_cache = ClaimCache()
+
+
+# Invalidation: changes are collected while the session works and applied
+# once the transaction commits, so readers never repopulate the cache with
+# rows that are about to change.
+
+# A bulk UPDATE/DELETE whose caller reports the changed claims itself, with
+# record_claim_changes(), carries this execution option; any other bulk
+# statement on claims drops every cached claim.
+RECORDED_OPTION = 'claim_cache_recorded'
+
+
+def pending_invalidation(session):
+    return session.info.setdefault('claim_cache', {'ids': set(), 'all': False, 'aggregates': False})
+
+
+def record_claim_changes(session, claim_ids):
+    """Invalidate claims changed by a bulk UPDATE run with RECORDED_OPTION; the caller commits"""
+    if claim_ids:
+        pending_invalidation(session)['ids'].update(claim_ids)
+
+
+@event.listens_for(Session, 'before_flush')
+def collect_flushed_claims(session, flush_context, instances):
+    pending = None
+    for obj in session.new:
+        if isinstance(obj, WarrantyClaim):
+            pending = pending or pending_invalidation(session)
+            pending['aggregates'] = True
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, WarrantyClaim) and obj.id is not None:
+            pending = pending or pending_invalidation(session)
+            pending['ids'].add(obj.id)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_bulk_changes(orm_execute_state):
+    """Catch UPDATE/DELETE statements on claims that bypass the unit of work"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return None
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not WarrantyClaim:
+        return None
+
+    if orm_execute_state.execution_options.get(RECORDED_OPTION):
+        return None
+    pending_invalidation(orm_execute_state.session)['all'] = True
+    return None
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_invalidation(session):
+    pending = session.info.pop('claim_cache', None)
+    if pending:
+        claim_cache.invalidate(pending['ids'], pending['all'], pending['aggregates'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_invalidation(session):
+    session.info.pop('claim_cache', None)
+
+
+def init_cache(app, redis_client=None):
+    if redis_client is not None:
+        claim_cache.backend = RedisCache(redis_client)
+        default_ttl = DEFAULT_TTL
+    else:
+        claim_cache.backend = LocalCache(int(app.config.get('CACHE_MAX_ENTRIES') or 1024))
+        default_ttl = LOCAL_TTL
+    claim_cache.ttl = int(app.config.get('CACHE_TTL') or default_ttl)
+    app.extensions['claim_cache'] = claim_cache
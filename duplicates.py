@@ -0,0 +1,106 @@
+import hashlib
+import re
+from collections import Counter
+from functools import lru_cache
+
+from flask import request
+
+from models import db, WarrantyClaim
+
+# Idempotency keys come from the Idempotency-Key header (API clients) or the
+# hidden idempotency_key field rendered into the claim form, so a
+# double-clicked submit or a retried POST maps back to the claim it created.
+# Clients choose the keys, so a claim stores a hash of the key together with
+# the submitter's email: a request that reuses someone else's key under its
+# own email never finds (or is shown) their claim.
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+# Issues whose 64-bit simhashes differ in at most SIMHASH_MAX_DISTANCE bits
+# are treated as the same text. Short issues move a lot of bits when a word
+# is added, so the threshold is loose; it is only ever applied to claims by
+# the same customer for the same product and purchase date.
+SIMHASH_BITS = 64
+SIMHASH_MAX_DISTANCE = 10
+
+
+def submission_key(email):
+    """The request's idempotency key scoped to the submitter's email, or None if it has none (or a malformed one)"""
+    key = (request.headers.get('Idempotency-Key') or request.form.get('idempotency_key') or '').strip()
+    if not email or not IDEMPOTENCY_KEY_PATTERN.match(key):
+        return None
+    return hashlib.sha256(f"{normalize_email(email)}\n{key}".encode()).hexdigest()
+
+
+def find_submission(key):
+    """The claim created by an earlier request with this idempotency key"""
+    if not key:
+        return None
+    return WarrantyClaim.query.filter_by(idempotency_key=key).first()
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+# Each hash bit gets its own LANE_BYTES-wide counter inside one big integer,
+# so adding a feature's weight to all 64 counters is a single addition.
+# LANES[byte] is the little-endian bytes of 8 lanes holding that byte's bits.
+LANE_BYTES = 4
+LANE_MASK = (1 << LANE_BYTES * 8) - 1
+LANES = [
+    b''.join(bytes([byte >> bit & 1]) + bytes(LANE_BYTES - 1) for bit in range(8))
+    for byte in range(256)
+]
+
+
+@lru_cache(maxsize=65536)
+def feature_lanes(feature):
+    """Lane integer for one feature; lane i holds bit i of its 64-bit hash"""
+    digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+    return int.from_bytes(b''.join(LANES[byte] for byte in reversed(digest)), 'little')
+
+
+def issue_simhash(issue):
+    """64-bit simhash of the issue text over words and word pairs, as a signed integer"""
+    words = re.findall(r'\w+', issue.lower())
+    features = Counter(words)
+    features.update(' '.join(pair) for pair in zip(words, words[1:]))
+
+    # A bit is set when the features that have it outweigh those that don't
+    lanes = 0
+    total = 0
+    for feature, count in features.items():
+        lanes += count * feature_lanes(feature)
+        total += count
+
+    value = 0
+    for bit in range(SIMHASH_BITS):
+        if 2 * (lanes >> (bit * LANE_BYTES * 8) & LANE_MASK) > total:
+            value |= 1 << bit
+    # Stored in a signed BIGINT column
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def hamming_distance(a, b):
+    return bin((a ^ b) & ((1 << SIMHASH_BITS) - 1)).count('1')
+
+
+def find_near_duplicate(email, product, purchase_date, simhash):
+    """Earlier claim for the same customer, product and purchase with near-identical issue text.
+
+    Uses the (email, product, purchase_date) index, so only that customer's
+    claims for the product are compared.
+    """
+    candidates = WarrantyClaim.query.with_entities(
+        WarrantyClaim.id, WarrantyClaim.issue_simhash
+    ).filter(
+        WarrantyClaim.email == email,
+        WarrantyClaim.product == product,
+        WarrantyClaim.purchase_date == purchase_date,
+        WarrantyClaim.issue_simhash.isnot(None)
+    ).order_by(WarrantyClaim.id.desc()).limit(20).all()
+
+    for claim_id, candidate_hash in candidates:
+        if hamming_distance(simhash, candidate_hash) <= SIMHASH_MAX_DISTANCE:
+            return db.session.get(WarrantyClaim, claim_id)
+    return None
@@ -0,0 +1,235 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import WarrantyClaim
+
+logger = logging.getLogger(__name__)
+
+# Live dashboard updates. Claim changes are collected while the session
+# works and published once the transaction commits, to a Redis stream when
+# REDIS_URL is set, otherwise to a log kept in this process (enough for a
+# single web process only; other processes never see its events):
+# - claim-created: a new claim, with its row for the claims listing
+# - claims-status: claims approved or rejected, by id
+# - claims-imported: a bulk import committed a batch
+# Dashboards follow the log through /admin/api/events (Server-Sent Events).
+# Event ids are positions in the log, so a reconnecting EventSource resumes
+# after the last event it received (Last-Event-ID). A dashboard whose
+# position has dropped out of the log gets a resync event and reloads.
+
+EVENT_BACKLOG = 1000  # Events kept for reconnecting dashboards
+HEARTBEAT_SECONDS = 15  # Keeps proxies from closing an idle stream
+
+
+def event_position(event_id):
+    """'1697040000000-3' -> (1697040000000, 3); a missing or malformed id sorts first"""
+    try:
+        ms, _, seq = event_id.partition('-')
+        return int(ms), int(seq or 0)
+    except (AttributeError, ValueError):
+        return 0, 0
+
+
+def format_position(position):
+    return f'{position[0]}-{position[1]}'
+
+
+class LocalEventLog:
+    """Events kept in this process; other processes never see them"""
+
+    def __init__(self, backlog=EVENT_BACKLOG):
+        self.events = deque(maxlen=backlog)
+        self.condition = threading.Condition()
+        # Events from before this process started are unknown to it
+        self.dropped = (int(time.time() * 1000), 0)
+        self.last = self.dropped
+
+    def append(self, events):
+        with self.condition:
+            for kind, data in events:
+                # Same id scheme as Redis streams: milliseconds, then a sequence number
+                ms = int(time.time() * 1000)
+                self.last = (ms, 0) if ms > self.last[0] else (self.last[0], self.last[1] + 1)
+                if len(self.events) == self.events.maxlen:
+                    self.dropped = self.events[0][0]
+                self.events.append((self.last, kind, data))
+            self.condition.notify_all()
+
+    def last_id(self):
+        with self.condition:
+            return format_position(self.last)
+
+    def read(self, after, timeout=0):
+        """Events after the id `after`, waiting up to timeout seconds for one; None if some were dropped"""
+        after = event_position(after)
+        with self.condition:
+            if timeout:
+                self.condition.wait_for(lambda: self.last > after, timeout)
+            if after < self.dropped:
+                return None
+            return [(format_position(position), kind, data) for position, kind, data in self.events if position > after]
+
+
+class RedisEventLog:
+    """Events in a Redis stream shared by all workers"""
+
+    def __init__(self, client, backlog=EVENT_BACKLOG, key='dashboard:events'):
+        self.client = client
+        self.backlog = backlog
+        self.key = key
+
+    def append(self, events):
+        pipe = self.client.pipeline(transaction=False)
+        for kind, data in events:
+            pipe.xadd(self.key, {'event': kind, 'data': data}, maxlen=self.backlog, approximate=True)
+        pipe.execute()
+
+    def last_id(self):
+        newest = self.client.xrevrange(self.key, count=1)
+        return newest[0][0].decode() if newest else '0-0'
+
+    def dropped_since(self, after):
+        from redis.exceptions import ResponseError
+
+        try:
+            info = self.client.xinfo_stream(self.key)
+        except ResponseError:
+            return False  # Nothing published yet
+        deleted = info.get('max-deleted-entry-id')
+        if deleted is not None:  # Redis 7+
+            return event_position(deleted.decode()) > after
+        # Approximate trimming always keeps at least `backlog` entries, so a
+        # shorter stream has never been trimmed
+        oldest = info.get('first-entry')
+        return info['length'] >= self.backlog and oldest is not None and event_position(oldest[0].decode()) > after
+
+    def read(self, after, timeout=0):
+        after = event_position(after)
+        if self.dropped_since(after):
+            return None
+        reply = self.client.xread(
+            {self.key: format_position(after)}, count=self.backlog, block=int(timeout * 1000) or None
+        )
+        return [
+            (event_id.decode(), fields[b'event'].decode(), fields[b'data'].decode())
+            for _, entries in reply for event_id, fields in entries
+        ]
+
+
+class DashboardEvents:
+    """Publishes claim changes to the event log that admin dashboards follow"""
+
+    def __init__(self, log=None):
+        self.log = log or LocalEventLog()
+
+    def publish(self, events):
+        try:
+            self.log.append([(kind, json.dumps(data)) for kind, data in events])
+        except Exception as e:
+            # The change is committed; dashboards catch up on their next reload
+            logger.error(f"Publishing dashboard events failed: {str(e)}")
+
+    def last_id(self):
+        return self.log.last_id()
+
+    def read(self, after, timeout=0):
+        return self.log.read(after, timeout)
+
+
+dashboard_events = DashboardEvents()
+
+
+def format_event(event_id, kind, data):
+    return f'id: {event_id}\nevent: {kind}\ndata: {data}\n\n'
+
+
+def event_stream(after, duration, retry):
+    """SSE messages for the events after `after`, for `duration` seconds.
+
+    With a duration of 0 the events already in the log are sent and the
+    response ends; the browser reconnects `retry` seconds later.
+    """
+    yield f'retry: {int(retry * 1000)}\n\n'
+    if not after:
+        after = dashboard_events.last_id()
+        # Gives the browser a position to resume from before any event arrives
+        yield format_event(after, 'ready', '{}')
+
+    deadline = time.monotonic() + duration
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            events = dashboard_events.read(after, min(remaining, HEARTBEAT_SECONDS) if remaining > 0 else 0)
+        except Exception as e:
+            logger.warning(f"Dashboard event log unavailable: {str(e)}")
+            return
+
+        if events is None:
+            after = dashboard_events.last_id()
+            yield format_event(after, 'resync', '{}')
+        elif events:
+            for event_id, kind, data in events:
+                yield format_event(event_id, kind, data)
+            after = events[-1][0]
+        elif remaining > 0:
+            yield ': keepalive\n\n'
+
+        if deadline - time.monotonic() <= 0:
+            return
+
+
+# Collection: like the cache invalidation, events wait in session.info until
+# the transaction commits, so dashboards never hear of a change that is
+# rolled back.
+
+def pending_events(session):
+    return session.info.setdefault('dashboard_events', [])
+
+
+def record_status_change(session, claim_ids, status, decided_at):
+    """Announce claims moved by a bulk status UPDATE; the caller commits"""
+    if claim_ids:
+        pending_events(session).append(
+            ('claims-status', {'ids': list(claim_ids), 'status': status, 'updated_at': decided_at.isoformat()})
+        )
+
+
+def record_import(session, count):
+    """Announce claims inserted by a bulk import; the caller commits"""
+    if count:
+        pending_events(session).append(('claims-imported', {'count': count}))
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_new_claims(session, flush_context):
+    # session.new still lists the objects that were just inserted
+    for obj in session.new:
+        if isinstance(obj, WarrantyClaim):
+            pending_events(session).append(('claim-created', obj.to_summary_dict()))
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_events(session):
+    events = session.info.pop('dashboard_events', None)
+    if events:
+        dashboard_events.publish(events)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_events(session):
+    session.info.pop('dashboard_events', None)
+
+
+def init_events(app, redis_client=None):
+    backlog = int(app.config.get('EVENT_BACKLOG') or EVENT_BACKLOG)
+    if redis_client is not None:
+        dashboard_events.log = RedisEventLog(redis_client, backlog)
+    else:
+        dashboard_events.log = LocalEventLog(backlog)
+    app.extensions['dashboard_events'] = dashboard_events
@@ -1,19 +1,37 @@
 import os
+import shutil
 
 # Get port from environment variable
 port = int(os.environ.get("PORT", 10000))
 bind = f"0.0.0.0:{port}"
 
-# Worker configuration
-workers = 2
-threads = 1
-worker_class = 'sync'
+# Worker configuration - reduce for Render's free tier
+#   WORKER_CLASS=sync   one request per thread; a slow upload holds a worker
+#   WORKER_CLASS=gevent cooperative workers; slow clients only park a greenlet
+worker_class = os.environ.get("WORKER_CLASS", "sync")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("WEB_THREADS", 1))
 timeout = 120
 
-# Logging
-accesslog = '-'
-errorlog = '-'
-loglevel = 'info'
+if worker_class == "gevent":
+    # Concurrent connections per worker; they share a small database pool
+    worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
+    os.environ.setdefault("DB_POOL_SIZE", "10")
+    # Read whole request bodies before the app runs (see middleware.py)
+    os.environ.setdefault("BUFFER_REQUEST_BODY", "true")
+    # Dashboard event streams stay open; a sync worker answers and closes
+    os.environ.setdefault("EVENT_STREAM_SECONDS", "300")
+
+# Each worker sizes its database pool from its thread count (see pooling.py)
+os.environ["WEB_THREADS"] = str(threads)
+
+# Prometheus metrics are written per worker here and merged by /metrics
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+# Logging configuration
+accesslog = "-"
+errorlog = "-"
+loglevel = "info"
 capture_output = True
 enable_stdio_inheritance = True
 
@@ -23,14 +41,23 @@ pidfile = None
 umask = 0
 user = None
 group = None
+tmp_upload_dir = None
 
 # Keep-alive
 keepalive = 2
 
+# Worker timeout
+graceful_timeout = 60
+
 # Maximum requests per worker
 max_requests = 1000
 max_requests_jitter = 50
 
+# Import the app once in the master and fork workers from it, so a worker
+# recycled by max_requests starts without importing anything. Not under
+# gevent, which must monkey-patch before the app is imported.
+preload_app = worker_class != "gevent"
+
 # SSL Configuration (if needed)
 keyfile = None
 certfile = None
@@ -41,41 +68,30 @@ reload_engine = 'auto'
 spew = False
 check_config = False
 
-# Worker configuration - reduce for Render's free tier
-workers = 2
-threads = 1
-timeout = 120
-worker_class = "sync"
-
-# Logging configuration
-accesslog = "-"
-errorlog = "-"
-loglevel = "info"
-capture_output = True
-enable_stdio_inheritance = True
 
-# Worker timeout
-graceful_timeout = 60
+def on_starting(server):
+    # Start every deployment with an empty metrics directory
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
 
-# Server mechanics
-tmp_upload_dir = None
+    # Without Redis each worker keeps its own dashboard event log (events.py)
+    if workers > 1 and not os.environ.get("REDIS_URL"):
+        server.log.warning(
+            f"REDIS_URL is not set: with {workers} workers, open dashboards "
+            "only see changes made through the worker serving their event stream"
+        )
 
-# Worker configuration - reduce for Render's free tier
-workers = 2
-threads = 1
-timeout = 120
-worker_class = "sync"
 
-# Logging configuration
-accesslog = "-"
-errorlog = "-"
-loglevel = "info"
-capture_output = True
-enable_stdio_inheritance = True
+def post_fork(server, worker):
+    # psycopg2 blocks in C; route its waits through gevent so a query only
+    # parks the current greenlet instead of the whole worker
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
 
-# Worker timeout
-graceful_timeout = 60
 
-# Maximum requests per worker
-max_requests = 1000
-max_requests_jitter = 50 
\ No newline at end of file
+def child_exit(server, worker):
+    # Drop live gauges of workers that exit (e.g. max_requests recycling)
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,302 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import insert
+
+from analytics import record_created, CLAIM_COLUMNS
+from events import record_import
+from cache import claim_cache
+from duplicates import normalize_email, issue_simhash
+from models import db, WarrantyClaim
+from references import generate_reference_number
+from validation import CLAIM_FIELDS, claim_errors
+
+logger = logging.getLogger(__name__)
+
+# Bulk import of claim feeds (CSV with a header row, or JSON Lines). Rows
+# are validated like the claim form, inserted in batches with one multi-row
+# INSERT per batch, and committed batch by batch, so an interrupted import
+# resumes from the last committed row. Every row gets an idempotency key
+# derived from its content, so re-sending rows that were already imported
+# inserts nothing.
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_FORMATS = ('csv', 'jsonl')
+ERROR_FILE_HEADER = ['row', 'error', 'data']
+
+
+class ImportResult:
+    """Progress of an import; last_row is the last row whose outcome is committed"""
+
+    def __init__(self, start_row=0):
+        self.start_row = start_row
+        self.last_row = start_row
+        self.inserted = 0
+        self.skipped = 0
+        self.rejected = 0
+
+    def to_dict(self):
+        return {
+            'start_row': self.start_row,
+            'last_row': self.last_row,
+            'inserted': self.inserted,
+            'skipped': self.skipped,
+            'rejected': self.rejected
+        }
+
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def field_name(name):
+    return name.strip().lower().replace('-', '_').replace(' ', '_')
+
+
+def clean_fields(row):
+    return {field_name(k): ('' if v is None else str(v)).strip() for k, v in row.items() if k is not None}
+
+
+def read_records(stream, fmt):
+    """Yield (row number, fields, error) for each record in a text stream"""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), 1):
+            if None in row:
+                yield number, clean_fields(row), 'More values than header columns'
+            else:
+                yield number, clean_fields(row), None
+        return
+
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield number, {'line': line.strip()}, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(data, dict):
+            yield number, {'line': line.strip()}, 'Expected a JSON object'
+            continue
+        yield number, clean_fields(data), None
+
+
+def row_key(fields):
+    """Idempotency key for an imported row, so the same claim is only ever inserted once"""
+    content = '\x1f'.join(fields[field] for field in CLAIM_FIELDS)
+    return 'imp-' + hashlib.sha256(content.encode()).hexdigest()[:40]
+
+
+def claim_values(fields, now):
+    """Column values for a valid row, or (None, error message)"""
+    errors = claim_errors(fields)
+    if errors:
+        return None, '; '.join(errors)
+
+    values = {field: fields[field] for field in CLAIM_FIELDS}
+    values['email'] = normalize_email(values['email'])
+    values.update(
+        reference_number=generate_reference_number(),
+        status='pending',
+        created_at=now,
+        idempotency_key=row_key(values),
+        issue_simhash=issue_simhash(values['issue'])
+    )
+    return values, None
+
+
+def insert_statement():
+    """Multi-row INSERT that skips rows whose idempotency key already exists"""
+    table = WarrantyClaim.__table__
+    # The inserted rows come back with what the analytics rollups count
+    returning = [table.c.id] + [table.c[column] for column in CLAIM_COLUMNS]
+    # Dialect modules are imported on use, so web workers never load them
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(table).returning(*returning)
+    return dialect_insert(table).on_conflict_do_nothing(index_elements=['idempotency_key']).returning(*returning)
+
+
+def insert_batch(batch):
+    """Insert and commit one batch; returns the number of rows actually inserted"""
+    inserted = db.session.execute(insert_statement(), batch).all()
+    record_created(db.session, [row._mapping for row in inserted])
+    record_import(db.session, len(inserted))
+    db.session.commit()
+    return len(inserted)
+
+
+def run_import(records, result, reject=None, batch_size=IMPORT_BATCH_SIZE, on_commit=None):
+    """Import records into warranty_claims, updating result as batches commit.
+
+    reject(row, error, fields) is called for every invalid row, and
+    on_commit(result) after every committed batch.
+    """
+    batch = []
+    pending_rejects = 0
+    number = result.last_row
+
+    def flush():
+        nonlocal batch, pending_rejects
+        if batch:
+            inserted = insert_batch(batch)
+            result.inserted += inserted
+            result.skipped += len(batch) - inserted
+        result.rejected += pending_rejects
+        result.last_row = number
+        batch = []
+        pending_rejects = 0
+        if on_commit:
+            on_commit(result)
+
+    for number, fields, error in records:
+        if number <= result.start_row:
+            continue
+        values = None
+        if error is None:
+            values, error = claim_values(fields, datetime.utcnow())
+        if error:
+            pending_rejects += 1
+            if reject:
+                reject(number, error, fields)
+        else:
+            batch.append(values)
+
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch or pending_rejects or number > result.last_row:
+        flush()
+
+    if result.inserted:
+        claim_cache.invalidate(aggregates=True)
+    return result
+
+
+def open_feed(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    return open(path, 'r', encoding='utf-8-sig', newline='')
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, checkpoint):
+    # Write then rename, so a crash never leaves a half-written checkpoint
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+claims_cli = AppGroup('claims', help='Warranty claim administration.')
+
+
+@claims_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), help='Defaults to the file extension.')
+@click.option('--errors', 'errors_path', help='Rejected rows (CSV). Default: PATH.errors.csv')
+@click.option('--checkpoint', 'checkpoint_path', help='Progress file. Default: PATH.checkpoint.json')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start from the first row.')
+@with_appcontext
+def import_command(path, fmt, errors_path, checkpoint_path, batch_size, restart):
+    """Import claims from a CSV or JSON Lines file (optionally gzipped)."""
+    fmt = fmt or detect_format(path)
+    errors_path = errors_path or path + '.errors.csv'
+    checkpoint_path = checkpoint_path or path + '.checkpoint.json'
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    result = ImportResult(checkpoint['last_row'] if checkpoint else 0)
+    if checkpoint:
+        result.inserted, result.skipped, result.rejected = (
+            checkpoint['inserted'], checkpoint['skipped'], checkpoint['rejected']
+        )
+        click.echo(f"Resuming after row {result.start_row}")
+
+    errors_file = open(errors_path, 'a+' if checkpoint else 'w', newline='')
+    if checkpoint:
+        # Drop rejects written after the last checkpoint; those rows are read again
+        errors_file.truncate(checkpoint['errors_size'])
+        errors_file.seek(checkpoint['errors_size'])
+    errors_writer = csv.writer(errors_file)
+    if not checkpoint:
+        errors_writer.writerow(ERROR_FILE_HEADER)
+
+    def reject(row, error, fields):
+        errors_writer.writerow([row, error, json.dumps(fields)])
+
+    def on_commit(result):
+        errors_file.flush()
+        save_checkpoint(checkpoint_path, dict(result.to_dict(), errors_size=errors_file.tell()))
+
+    started = time.perf_counter()
+    try:
+        with open_feed(path) as feed:
+            run_import(read_records(feed, fmt), result, reject, batch_size, on_commit)
+    except Exception:
+        db.session.rollback()
+        logger.error(f"Import stopped after row {result.last_row}; rerun the command to resume")
+        raise
+    finally:
+        errors_file.close()
+
+    os.remove(checkpoint_path)
+    elapsed = time.perf_counter() - started
+    click.echo(
+        f"Imported {result.inserted} claims in {elapsed:.1f}s "
+        f"({result.skipped} already imported, {result.rejected} rejected"
+        + (f", see {errors_path})" if result.rejected else ")")
+    )
+
+
+class ImportFailed(Exception):
+    def __init__(self, result, rejects):
+        super().__init__(f"Import stopped after row {result.last_row}")
+        self.result = result
+        # Only rows up to the last commit; the rest are read again on retry
+        self.rejects = [reject for reject in rejects if reject['row'] <= result.last_row]
+
+
+def import_stream(stream, fmt, start_row=0, gzipped=False):
+    """Import a feed from a binary stream (an API request body); returns (result, rejects)"""
+    if gzipped:
+        stream = gzip.GzipFile(fileobj=stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    result = ImportResult(start_row)
+    rejects = []
+    try:
+        run_import(read_records(text, fmt), result, lambda row, error, fields: rejects.append(
+            {'row': row, 'error': error}
+        ))
+    except Exception:
+        db.session.rollback()
+        raise ImportFailed(result, rejects)
+    return result, rejects
+
+
+def init_importer(app):
+    app.cli.add_command(claims_cli)
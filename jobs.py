@@ -0,0 +1,349 @@
+import json
+import logging
+import random
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import update
+
+from models import db, BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Retry backoff: BACKOFF_BASE * 2^attempt seconds (plus jitter), capped at BACKOFF_MAX
+BACKOFF_BASE = 5
+BACKOFF_MAX = 15 * 60
+DEFAULT_MAX_RETRIES = 5
+# A job still running this many seconds after a worker took it is assumed to
+# belong to a worker that died, and is handed to another worker. Keep it well
+# above the longest job.
+VISIBILITY_TIMEOUT = 15 * 60
+REAP_INTERVAL = 60  # Seconds between each worker's checks for abandoned jobs
+CLAIM_CANDIDATES = 10  # Due jobs a database worker tries to claim per poll
+ABANDONED_ERROR = 'Abandoned: the worker stopped before the job finished'
+
+# Registered task functions, by name
+TASKS = {}
+
+
+def task(name=None, max_retries=DEFAULT_MAX_RETRIES):
+    """Register a function as a background task"""
+    def decorator(func):
+        func.max_retries = max_retries
+        TASKS[name or func.__name__] = func
+        return func
+    return decorator
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed `attempts` times"""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay + random.uniform(0, delay / 4)
+
+
+class Job:
+    def __init__(self, task, kwargs, id=None, attempts=0):
+        self.id = id or uuid.uuid4().hex
+        self.task = task
+        self.kwargs = kwargs
+        self.attempts = attempts
+        self.payload = None  # The queue entry, when RedisQueue took the job
+
+    def to_json(self):
+        return json.dumps({
+            'id': self.id,
+            'task': self.task,
+            'kwargs': self.kwargs,
+            'attempts': self.attempts
+        })
+
+    @classmethod
+    def from_json(cls, payload):
+        return cls(**json.loads(payload))
+
+    def __repr__(self):
+        return f'<Job {self.task} {self.id}>'
+
+
+def abandoned(job):
+    """Count a run cut short by a dead worker as a failed attempt; False once retries are used up"""
+    job.attempts += 1
+    max_retries = getattr(TASKS.get(job.task), 'max_retries', 0)
+    if job.attempts <= max_retries:
+        logger.warning(f"{job!r} was abandoned by its worker (attempt {job.attempts}), requeueing")
+        return True
+    logger.error(f"{job!r} was abandoned by its worker and has no retries left")
+    return False
+
+
+class RedisQueue:
+    """Job queue in Redis: a ready list plus a sorted set of delayed retries.
+
+    A worker moves each job it takes to a processing list and records when it
+    took it; jobs left there past the visibility timeout go back on the ready list.
+    """
+
+    def __init__(self, client, name='jobs', visibility_timeout=VISIBILITY_TIMEOUT):
+        self.client = client
+        self.visibility_timeout = visibility_timeout
+        self.ready_key = f'{name}:ready'
+        self.scheduled_key = f'{name}:scheduled'
+        self.processing_key = f'{name}:processing'
+        self.claimed_key = f'{name}:claimed'
+        self.failed_key = f'{name}:failed'
+        self.reaped_at = 0
+
+    def enqueue(self, job, delay=0):
+        if delay:
+            self.client.zadd(self.scheduled_key, {job.to_json(): time.time() + delay})
+        else:
+            self.client.lpush(self.ready_key, job.to_json())
+
+    def promote_scheduled(self):
+        """Move delayed jobs that are due onto the ready list"""
+        for payload in self.client.zrangebyscore(self.scheduled_key, 0, time.time()):
+            # Only the worker that wins the ZREM moves the job, so it is not duplicated
+            if self.client.zrem(self.scheduled_key, payload):
+                self.client.lpush(self.ready_key, payload)
+
+    def requeue_abandoned(self):
+        """Put jobs taken more than visibility_timeout ago back on the ready list"""
+        now = time.time()
+        for payload in self.client.lrange(self.processing_key, 0, -1):
+            claimed_at = self.client.zscore(self.claimed_key, payload)
+            if claimed_at is None:
+                # The worker died between taking the job and recording the time
+                self.client.zadd(self.claimed_key, {payload: now}, nx=True)
+                continue
+            if claimed_at > now - self.visibility_timeout:
+                continue
+            # Only the worker that wins the LREM requeues the job
+            if self.client.lrem(self.processing_key, 1, payload):
+                self.client.zrem(self.claimed_key, payload)
+                job = Job.from_json(payload)
+                if abandoned(job):
+                    self.client.lpush(self.ready_key, job.to_json())
+                else:
+                    self.client.lpush(self.failed_key, job.to_json())
+
+    def dequeue(self, timeout=5):
+        self.promote_scheduled()
+        if time.time() - self.reaped_at >= REAP_INTERVAL:
+            self.reaped_at = time.time()
+            self.requeue_abandoned()
+        payload = self.client.blmove(self.ready_key, self.processing_key, timeout, 'RIGHT', 'LEFT')
+        if payload is None:
+            return None
+        self.client.zadd(self.claimed_key, {payload: time.time()})
+        job = Job.from_json(payload)
+        job.payload = payload
+        return job
+
+    def release(self, job):
+        """Drop a job from the processing list once its run has ended"""
+        if job.payload is not None:
+            self.client.lrem(self.processing_key, 1, job.payload)
+            self.client.zrem(self.claimed_key, job.payload)
+
+    def complete(self, job):
+        self.release(job)
+
+    def retry(self, job, delay, error):
+        self.enqueue(job, delay=delay)
+        self.release(job)
+
+    def fail(self, job, error):
+        self.client.lpush(self.failed_key, job.to_json())
+        self.release(job)
+
+
+class DatabaseQueue:
+    """Job queue in the background_jobs table, for deployments without Redis"""
+
+    def __init__(self, poll_interval=1, visibility_timeout=VISIBILITY_TIMEOUT):
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.reaped_at = 0
+
+    def enqueue(self, job, delay=0):
+        db.session.add(BackgroundJob(
+            id=job.id,
+            task=job.task,
+            payload=json.dumps(job.kwargs),
+            attempts=job.attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay)
+        ))
+        db.session.commit()
+
+    def due_jobs(self):
+        # SKIP LOCKED lets several workers poll the table without blocking each other
+        # on Postgres. SQLite ignores it, so the rows are only candidates: see claim()
+        return BackgroundJob.query.filter(
+            BackgroundJob.status == 'queued',
+            BackgroundJob.run_at <= datetime.utcnow()
+        ).order_by(BackgroundJob.run_at).limit(CLAIM_CANDIDATES).with_for_update(skip_locked=True).all()
+
+    def claim(self, job, run_at):
+        """Mark a job read by due_jobs() as running; False if another worker took it first"""
+        # Conditional on the job being as it was read, so of two workers that
+        # read the same row only one UPDATE matches it
+        result = db.session.execute(
+            update(BackgroundJob).where(
+                BackgroundJob.id == job.id,
+                BackgroundJob.status == 'queued',
+                BackgroundJob.attempts == job.attempts,
+                BackgroundJob.run_at == run_at
+            ).values(status='running', claimed_at=datetime.utcnow()),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def claim_next(self):
+        candidates = [
+            (Job(row.task, json.loads(row.payload), id=row.id, attempts=row.attempts), row.run_at)
+            for row in self.due_jobs()
+        ]
+        for job, run_at in candidates:
+            if self.claim(job, run_at):
+                return job
+        db.session.rollback()
+        return None
+
+    def requeue_abandoned(self):
+        """Requeue jobs marked running for longer than visibility_timeout"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.visibility_timeout)
+        rows = BackgroundJob.query.filter(
+            BackgroundJob.status == 'running',
+            BackgroundJob.claimed_at < cutoff
+        ).with_for_update(skip_locked=True).all()
+
+        for row in rows:
+            job = Job(row.task, None, id=row.id, attempts=row.attempts)
+            # Conditional like claim(), so a job is only requeued once
+            result = db.session.execute(
+                update(BackgroundJob).where(
+                    BackgroundJob.id == row.id,
+                    BackgroundJob.status == 'running',
+                    BackgroundJob.claimed_at == row.claimed_at
+                ).values(
+                    status='queued' if abandoned(job) else 'failed',
+                    attempts=job.attempts,
+                    run_at=datetime.utcnow(),
+                    last_error=ABANDONED_ERROR
+                ),
+                execution_options={'synchronize_session': False}
+            )
+            if result.rowcount != 1:
+                logger.info(f"{job!r} was already requeued by another worker")
+        db.session.commit()
+
+    def dequeue(self, timeout=5):
+        if time.time() - self.reaped_at >= REAP_INTERVAL:
+            self.reaped_at = time.time()
+            self.requeue_abandoned()
+        deadline = time.time() + timeout
+        while True:
+            job = self.claim_next()
+            if job or time.time() >= deadline:
+                return job
+            time.sleep(self.poll_interval)
+
+    def update(self, job, **values):
+        BackgroundJob.query.filter_by(id=job.id).update(values)
+        db.session.commit()
+
+    def complete(self, job):
+        self.update(job, status='done')
+
+    def retry(self, job, delay, error):
+        self.update(
+            job,
+            status='queued',
+            attempts=job.attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+            last_error=error
+        )
+
+    def fail(self, job, error):
+        self.update(job, status='failed', attempts=job.attempts, last_error=error)
+
+
+def enqueue(task_name, delay=0, **kwargs):
+    """Queue a registered task to run in the worker process"""
+    if task_name not in TASKS:
+        raise ValueError(f"Unknown task: {task_name}")
+
+    job = Job(task_name, kwargs)
+    current_app.extensions['job_queue'].enqueue(job, delay=delay)
+    logger.info(f"Enqueued {job!r}")
+    return job
+
+
+def run_job(queue, job):
+    """Run one job, scheduling a retry with backoff if it fails"""
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise ValueError(f"Unknown task: {job.task}")
+        func(**job.kwargs)
+        queue.complete(job)
+        logger.info(f"Completed {job!r}")
+    except Exception as e:
+        db.session.rollback()
+        job.attempts += 1
+        error = f"{e.__class__.__name__}: {e}"
+        max_retries = getattr(func, 'max_retries', 0)
+
+        if job.attempts <= max_retries:
+            delay = backoff(job.attempts)
+            logger.warning(f"{job!r} failed (attempt {job.attempts}), retrying in {delay:.0f}s: {error}")
+            queue.retry(job, delay, error)
+        else:
+            logger.error(f"{job!r} failed permanently: {error}")
+            logger.error(traceback.format_exc())
+            queue.fail(job, error)
+    finally:
+        # Start every job with a fresh session so state never leaks between jobs
+        db.session.remove()
+
+
+def run_worker(queue, burst=False):
+    """Process jobs until interrupted, or until the queue is empty when burst is set"""
+    logger.info(f"Worker started using {queue.__class__.__name__}")
+    while True:
+        job = queue.dequeue(timeout=1 if burst else 5)
+        if job is None:
+            if burst:
+                return
+            continue
+        run_job(queue, job)
+
+
+def create_queue(config, redis_client=None):
+    """Use Redis when it is configured, otherwise the database"""
+    visibility_timeout = int(config.get('JOB_VISIBILITY_TIMEOUT') or VISIBILITY_TIMEOUT)
+    if redis_client is not None:
+        return RedisQueue(redis_client, name=config.get('JOB_QUEUE_NAME', 'jobs'), visibility_timeout=visibility_timeout)
+    return DatabaseQueue(visibility_timeout=visibility_timeout)
+
+
+jobs_cli = AppGroup('jobs', help='Background job queue.')
+
+
+@jobs_cli.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+@with_appcontext
+def worker_command(burst):
+    """Run a background job worker."""
+    run_worker(current_app.extensions['job_queue'], burst=burst)
+
+
+def init_jobs(app, redis_client=None):
+    app.extensions['job_queue'] = create_queue(app.config, redis_client)
+    app.cli.add_command(jobs_cli)
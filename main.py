@@ -1,4 +1,7 @@
-from app import app
+from app import create_app, init_database
+
+app = create_app()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
+    init_database(app)
+    app.run(host="0.0.0.0", port=5001, debug=True)
@@ -0,0 +1,139 @@
+import os
+import time
+
+from flask import Response, has_request_context, request, before_render_template, template_rendered
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+# (set in gunicorn_config.py) and /metrics merges them, so a scrape sees the
+# whole server no matter which worker answers it.
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by endpoint',
+    ['method', 'endpoint', 'status']
+)
+DB_QUERIES = Histogram(
+    'db_queries_per_request',
+    'Number of SQL statements executed per request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float('inf'))
+)
+DB_TIME = Histogram(
+    'db_query_seconds_per_request',
+    'Total time spent in SQL statements per request',
+    ['endpoint']
+)
+TEMPLATE_RENDER = Histogram(
+    'template_render_seconds',
+    'Template render time',
+    ['template']
+)
+UPLOAD_BYTES = Counter(
+    'upload_bytes_total',
+    'Bytes received in multipart uploads',
+    ['endpoint']
+)
+REQUESTS_SHED = Counter(
+    'requests_shed_total',
+    'Requests refused with 429 by admission control, before reaching the app',
+    ['path', 'reason']
+)
+CACHE_REQUESTS = Counter(
+    'claim_cache_requests_total',
+    'Claim cache lookups by result',
+    ['result']
+)
+
+
+def endpoint_label():
+    # The view function name keeps label cardinality bounded (no ids or paths)
+    return request.endpoint or 'unmatched'
+
+
+def request_state():
+    # Kept in the WSGI environ rather than g so that queries run while a
+    # streamed response (e.g. the CSV export) is being sent are still counted
+    return request.environ.get('metrics.state') if has_request_context() else None
+
+
+def start_timer():
+    request.environ['metrics.state'] = {
+        'start': time.perf_counter(),
+        'db_queries': 0,
+        'db_seconds': 0.0,
+        'render_starts': []
+    }
+
+
+def record_request(response):
+    state = request_state()
+    if state is None:
+        return response
+
+    method = request.method
+    endpoint = endpoint_label()
+    status = response.status_code
+
+    def observe():
+        REQUEST_LATENCY.labels(method, endpoint, status).observe(time.perf_counter() - state['start'])
+        DB_QUERIES.labels(endpoint).observe(state['db_queries'])
+        DB_TIME.labels(endpoint).observe(state['db_seconds'])
+
+    if response.is_streamed:
+        response.call_on_close(observe)
+    else:
+        observe()
+
+    if method == 'POST' and request.mimetype == 'multipart/form-data':
+        UPLOAD_BYTES.labels(endpoint).inc(request.content_length or 0)
+
+    return response
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if request_state() is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    state = request_state()
+    starts = conn.info.get('query_start')
+    if state is not None and starts:
+        state['db_queries'] += 1
+        state['db_seconds'] += time.perf_counter() - starts.pop()
+
+
+def before_render(sender, template, context, **extra):
+    state = request_state()
+    if state is not None:
+        state['render_starts'].append(time.perf_counter())
+
+
+def after_render(sender, template, context, **extra):
+    state = request_state()
+    if state is not None and state['render_starts']:
+        TEMPLATE_RENDER.labels(template.name or 'string').observe(time.perf_counter() - state['render_starts'].pop())
+
+
+def metrics_view():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    app.before_request(start_timer)
+    app.after_request(record_request)
+    before_render_template.connect(before_render, app)
+    template_rendered.connect(after_render, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,68 @@
+import tempfile
+
+# Bodies up to this size stay in memory; larger ones spill to a temp file
+SPOOL_MEMORY_LIMIT = 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class BufferRequestBody:
+    """WSGI middleware that reads the whole request body before calling the app.
+
+    Under gevent workers a slow client only parks a greenlet while the body is
+    received here, and the Flask view (and its database connection) starts
+    only once the upload is complete. Bodies declared larger than max_size (or
+    the limit for the path in path_limits) are refused with 413 before
+    anything is read.
+    """
+
+    def __init__(self, app, max_size, path_limits=None):
+        self.app = app
+        self.max_size = max_size
+        self.path_limits = path_limits or {}
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') not in ('POST', 'PUT', 'PATCH'):
+            return self.app(environ, start_response)
+
+        max_size = self.path_limits.get(environ.get('PATH_INFO'), self.max_size)
+
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > max_size:
+            return self.too_large(start_response)
+
+        chunked = environ.get('HTTP_TRANSFER_ENCODING', '').lower() == 'chunked'
+        if not length and not chunked:
+            return self.app(environ, start_response)
+
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT)
+        stream = environ['wsgi.input']
+        remaining = length if length else max_size + 1
+        received = 0
+        while remaining > 0:
+            chunk = stream.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            body.write(chunk)
+            received += len(chunk)
+            remaining -= len(chunk)
+
+        if received > max_size:
+            body.close()
+            return self.too_large(start_response)
+
+        body.seek(0)
+        environ['wsgi.input'] = body
+        environ['CONTENT_LENGTH'] = str(received)
+        environ.pop('HTTP_TRANSFER_ENCODING', None)
+        environ['wsgi.input_terminated'] = False
+        return self.app(environ, start_response)
+
+    def too_large(self, start_response):
+        start_response('413 Request Entity Too Large', [
+            ('Content-Type', 'text/plain'),
+            ('Connection', 'close')
+        ])
+        return [b'Request body too large']
@@ -0,0 +1,47 @@
+"""create warranty_claims table
+
+Revision ID: 3f1c2a9d8b01
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8b01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Deployments created before migrations existed already have this table
+    # from db.create_all(), so the baseline only creates it when missing.
+    if sa.inspect(op.get_bind()).has_table('warranty_claims'):
+        return
+
+    op.create_table(
+        'warranty_claims',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('reference_number', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=False),
+        sa.Column('product', sa.String(length=200), nullable=False),
+        sa.Column('purchase_date', sa.String(length=10), nullable=False),
+        sa.Column('issue', sa.Text(), nullable=False),
+        sa.Column('defect_reason', sa.String(length=50), nullable=False),
+        sa.Column('warranty_option', sa.String(length=50), nullable=False),
+        sa.Column('file_path', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('reference_number')
+    )
+
+
+def downgrade():
+    op.drop_table('warranty_claims')
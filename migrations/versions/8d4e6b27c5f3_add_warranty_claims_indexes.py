@@ -0,0 +1,46 @@
+"""add indexes for dashboard sorting, status filters and email lookups
+
+Revision ID: 8d4e6b27c5f3
+Revises: 3f1c2a9d8b01
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4e6b27c5f3'
+down_revision = '3f1c2a9d8b01'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_warranty_claims_created_at_id', ['created_at', 'id']),
+    ('ix_warranty_claims_status_created_at', ['status', 'created_at']),
+    ('ix_warranty_claims_email', ['email']),
+]
+
+
+def existing_indexes():
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('warranty_claims')}
+
+
+def upgrade():
+    existing = existing_indexes()
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; building the
+    # indexes this way on Postgres does not block inserts into the table.
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            if name not in existing:
+                op.create_index(name, 'warranty_claims', columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    existing = existing_indexes()
+
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            if name in existing:
+                op.drop_index(name, table_name='warranty_claims', postgresql_concurrently=True)
@@ -0,0 +1,25 @@
+"""drop the stored all-claims totals from claim_rollups
+
+Revision ID: a6e2d9c4f1b7
+Revises: f3a9c6d2b481
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e2d9c4f1b7'
+down_revision = 'f3a9c6d2b481'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Totals are now summed from the defect_reason rows when read (analytics.py)
+    op.execute("DELETE FROM claim_rollups WHERE dimension = 'all'")
+
+
+def downgrade():
+    # The previous code reads stored totals again: run `flask analytics rebuild`
+    pass
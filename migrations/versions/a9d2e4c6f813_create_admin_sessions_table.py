@@ -0,0 +1,35 @@
+"""create admin_sessions table
+
+Revision ID: a9d2e4c6f813
+Revises: f4a3c9e1b7d2
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d2e4c6f813'
+down_revision = 'f4a3c9e1b7d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('admin_sessions'):
+        return
+
+    op.create_table(
+        'admin_sessions',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_admin_sessions_expires_at', 'admin_sessions', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_admin_sessions_expires_at', table_name='admin_sessions')
+    op.drop_table('admin_sessions')
@@ -0,0 +1,63 @@
+"""add idempotency key, issue simhash and duplicate link to warranty_claims
+
+Revision ID: b3e7f1a2c9d4
+Revises: a9d2e4c6f813
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e7f1a2c9d4'
+down_revision = 'a9d2e4c6f813'
+branch_labels = None
+depends_on = None
+
+COLUMN_NAMES = ['idempotency_key', 'issue_simhash', 'duplicate_of_id']
+
+
+def new_columns(dialect):
+    # SQLite cannot add a foreign key to an existing table without rebuilding
+    # it (which would also drop the full-text search triggers)
+    references = [] if dialect == 'sqlite' else [sa.ForeignKey('warranty_claims.id')]
+    return [
+        sa.Column('idempotency_key', sa.String(length=64), nullable=True),
+        sa.Column('issue_simhash', sa.BigInteger(), nullable=True),
+        sa.Column('duplicate_of_id', sa.Integer(), *references, nullable=True),
+    ]
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = {c['name'] for c in inspector.get_columns('warranty_claims')}
+    for column in new_columns(bind.dialect.name):
+        if column.name not in columns:
+            op.add_column('warranty_claims', column)
+
+    indexes = {ix['name'] for ix in inspector.get_indexes('warranty_claims')}
+    with op.get_context().autocommit_block():
+        if 'ix_warranty_claims_idempotency_key' not in indexes:
+            op.create_index('ix_warranty_claims_idempotency_key', 'warranty_claims', ['idempotency_key'],
+                            unique=True, postgresql_concurrently=True)
+        if 'ix_warranty_claims_email_product_purchase_date' not in indexes:
+            op.create_index('ix_warranty_claims_email_product_purchase_date', 'warranty_claims',
+                            ['email', 'product', 'purchase_date'], postgresql_concurrently=True)
+        # The composite index starts with email, so it also serves email lookups
+        if 'ix_warranty_claims_email' in indexes:
+            op.drop_index('ix_warranty_claims_email', table_name='warranty_claims', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_warranty_claims_email', 'warranty_claims', ['email'], postgresql_concurrently=True)
+        op.drop_index('ix_warranty_claims_email_product_purchase_date', table_name='warranty_claims',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_warranty_claims_idempotency_key', table_name='warranty_claims',
+                      postgresql_concurrently=True)
+
+    with op.batch_alter_table('warranty_claims') as batch_op:
+        for name in reversed(COLUMN_NAMES):
+            batch_op.drop_column(name)
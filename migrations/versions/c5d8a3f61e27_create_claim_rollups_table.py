@@ -0,0 +1,41 @@
+"""create claim_rollups table
+
+Revision ID: c5d8a3f61e27
+Revises: b3e7f1a2c9d4
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8a3f61e27'
+down_revision = 'b3e7f1a2c9d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing claims are rolled up by `flask analytics rebuild`
+    if sa.inspect(op.get_bind()).has_table('claim_rollups'):
+        return
+
+    op.create_table(
+        'claim_rollups',
+        sa.Column('period', sa.String(length=8), nullable=False),
+        sa.Column('dimension', sa.String(length=20), nullable=False),
+        sa.Column('bucket', sa.Date(), nullable=False),
+        sa.Column('value', sa.String(length=200), nullable=False),
+        sa.Column('claims', sa.Integer(), nullable=False),
+        sa.Column('pending', sa.Integer(), nullable=False),
+        sa.Column('approved', sa.Integer(), nullable=False),
+        sa.Column('rejected', sa.Integer(), nullable=False),
+        sa.Column('approval_seconds', sa.BigInteger(), nullable=False),
+        sa.Column('rejection_seconds', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('period', 'dimension', 'bucket', 'value')
+    )
+
+
+def downgrade():
+    op.drop_table('claim_rollups')
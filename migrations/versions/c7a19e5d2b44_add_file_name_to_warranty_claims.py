@@ -0,0 +1,27 @@
+"""add original upload file name to warranty_claims
+
+Revision ID: c7a19e5d2b44
+Revises: 8d4e6b27c5f3
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a19e5d2b44'
+down_revision = '8d4e6b27c5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('warranty_claims')}
+    if 'file_name' not in columns:
+        op.add_column('warranty_claims', sa.Column('file_name', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('warranty_claims') as batch_op:
+        batch_op.drop_column('file_name')
@@ -0,0 +1,39 @@
+"""add upload thumbnail and processing time to warranty_claims
+
+Revision ID: d1f6b8e4a372
+Revises: c5d8a3f61e27
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1f6b8e4a372'
+down_revision = 'c5d8a3f61e27'
+branch_labels = None
+depends_on = None
+
+COLUMN_NAMES = ['thumbnail_path', 'upload_processed_at']
+
+
+def new_columns():
+    return [
+        sa.Column('thumbnail_path', sa.String(length=255), nullable=True),
+        sa.Column('upload_processed_at', sa.DateTime(), nullable=True),
+    ]
+
+
+def upgrade():
+    # Existing uploads are processed by `flask uploads process`
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('warranty_claims')}
+    for column in new_columns():
+        if column.name not in columns:
+            op.add_column('warranty_claims', column)
+
+
+def downgrade():
+    with op.batch_alter_table('warranty_claims') as batch_op:
+        for name in reversed(COLUMN_NAMES):
+            batch_op.drop_column(name)
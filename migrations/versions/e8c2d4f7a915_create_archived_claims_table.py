@@ -0,0 +1,58 @@
+"""create archived_claims table and index duplicate links
+
+Revision ID: e8c2d4f7a915
+Revises: d1f6b8e4a372
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c2d4f7a915'
+down_revision = 'd1f6b8e4a372'
+branch_labels = None
+depends_on = None
+
+DUPLICATE_CONDITION = sa.text('duplicate_of_id IS NOT NULL')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'archived_claims' not in inspector.get_table_names():
+        op.create_table(
+            'archived_claims',
+            sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('reference_number', sa.String(length=64), nullable=False),
+            sa.Column('email', sa.String(length=100), nullable=False),
+            sa.Column('product', sa.String(length=200), nullable=False),
+            sa.Column('defect_reason', sa.String(length=50), nullable=False),
+            sa.Column('warranty_option', sa.String(length=50), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('file_path', sa.String(length=255), nullable=True),
+            sa.Column('file_name', sa.String(length=255), nullable=True),
+            sa.Column('thumbnail_path', sa.String(length=255), nullable=True),
+            sa.Column('archived_at', sa.DateTime(), nullable=False),
+            sa.Column('data', sa.Text(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('reference_number')
+        )
+        op.create_index('ix_archived_claims_email', 'archived_claims', ['email'])
+
+    indexes = {ix['name'] for ix in inspector.get_indexes('warranty_claims')}
+    if 'ix_warranty_claims_duplicate_of_id' not in indexes:
+        with op.get_context().autocommit_block():
+            op.create_index('ix_warranty_claims_duplicate_of_id', 'warranty_claims', ['duplicate_of_id'],
+                            postgresql_where=DUPLICATE_CONDITION, sqlite_where=DUPLICATE_CONDITION,
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_warranty_claims_duplicate_of_id', table_name='warranty_claims',
+                      postgresql_concurrently=True)
+    op.drop_index('ix_archived_claims_email', table_name='archived_claims')
+    op.drop_table('archived_claims')
@@ -0,0 +1,36 @@
+"""add claimed_at to background_jobs
+
+Revision ID: f3a9c6d2b481
+Revises: e8c2d4f7a915
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c6d2b481'
+down_revision = 'e8c2d4f7a915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('background_jobs')}
+    if 'claimed_at' not in columns:
+        op.add_column('background_jobs', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+        # Jobs left running by workers from before the upgrade are reclaimed
+        # once the visibility timeout passes. The columns hold naive UTC
+        # (datetime.utcnow), which CURRENT_TIMESTAMP is not on every server.
+        op.execute(
+            sa.text("UPDATE background_jobs SET claimed_at = :now WHERE status = 'running'")
+            .bindparams(now=datetime.utcnow())
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('background_jobs') as batch_op:
+        batch_op.drop_column('claimed_at')
@@ -0,0 +1,53 @@
+"""add full-text search vector and GIN index to warranty_claims
+
+Revision ID: f4a3c9e1b7d2
+Revises: e2b5d81f7a90
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a3c9e1b7d2'
+down_revision = 'e2b5d81f7a90'
+branch_labels = None
+depends_on = None
+
+# Weights feed ts_rank: reference number and email first, issue text last
+SEARCH_VECTOR = """
+    setweight(to_tsvector('simple', coalesce(reference_number, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(email, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(name, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(product, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce(issue, '')), 'D')
+"""
+
+
+def upgrade():
+    # SQLite builds its FTS5 table at startup (search.install_search_index);
+    # only Postgres needs a schema change here.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Adding a stored generated column rewrites the table once; after that
+    # Postgres keeps the vector up to date on every insert and update.
+    op.execute(
+        f"ALTER TABLE warranty_claims ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED"
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_warranty_claims_search_vector "
+            "ON warranty_claims USING gin (search_vector)"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_warranty_claims_search_vector")
+    op.execute("ALTER TABLE warranty_claims DROP COLUMN IF EXISTS search_vector")
@@ -1,10 +1,27 @@
+import json
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class WarrantyClaim(db.Model):
     __tablename__ = 'warranty_claims'
+    __table_args__ = (
+        # Dashboard listing and keyset pagination (newest first)
+        db.Index('ix_warranty_claims_created_at_id', 'created_at', 'id'),
+        # Status queues and status-filtered listings
+        db.Index('ix_warranty_claims_status_created_at', 'status', 'created_at'),
+        # Customer lookups and near-duplicate checks at submission
+        db.Index('ix_warranty_claims_email_product_purchase_date', 'email', 'product', 'purchase_date'),
+        # Replayed submissions
+        db.Index('ix_warranty_claims_idempotency_key', 'idempotency_key', unique=True),
+        # Claims marked as duplicates of a claim, checked before archiving it
+        db.Index('ix_warranty_claims_duplicate_of_id', 'duplicate_of_id',
+                 postgresql_where=db.text('duplicate_of_id IS NOT NULL'),
+                 sqlite_where=db.text('duplicate_of_id IS NOT NULL')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     reference_number = db.Column(db.String(64), unique=True, nullable=False)
@@ -16,14 +33,32 @@ class WarrantyClaim(db.Model):
     issue = db.Column(db.Text, nullable=False)
     defect_reason = db.Column(db.String(50), nullable=False)
     warranty_option = db.Column(db.String(50), nullable=False)
-    file_path = db.Column(db.String(255), nullable=True)
+    file_path = db.Column(db.String(255), nullable=True)  # Storage key of the upload
+    file_name = db.Column(db.String(255), nullable=True)  # Original (sanitized) upload name
+    thumbnail_path = db.Column(db.String(255), nullable=True)  # Storage key of the upload's JPEG thumbnail
+    upload_processed_at = db.Column(db.DateTime, nullable=True)  # When the worker processed the upload
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=True, onupdate=datetime.utcnow)
     status = db.Column(db.String(20), nullable=False, default='pending')
+    idempotency_key = db.Column(db.String(64), nullable=True)  # Client key of the creating request
+    issue_simhash = db.Column(db.BigInteger, nullable=True)  # Similarity hash of the issue text
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('warranty_claims.id'), nullable=True)  # Earlier near-identical claim
 
     def __repr__(self):
         return f'<WarrantyClaim {self.reference_number}>'
 
+    def to_summary_dict(self):
+        """Columns needed for a row in the admin claims listing"""
+        return {
+            'id': self.id,
+            'reference_number': self.reference_number,
+            'name': self.name,
+            'product': self.product,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'duplicate_of_id': self.duplicate_of_id
+        }
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -37,7 +72,109 @@ class WarrantyClaim(db.Model):
             'defect_reason': self.defect_reason,
             'warranty_option': self.warranty_option,
             'file_path': self.file_path,
+            'file_name': self.file_name,
+            'thumbnail_path': self.thumbnail_path,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'status': self.status
+            'status': self.status,
+            'duplicate_of_id': self.duplicate_of_id
         }
+
+
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        # Workers poll for the oldest due job
+        db.Index('ix_background_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    task = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON-encoded task kwargs
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, nullable=True)  # When a worker last took the job
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.task} {self.id}>'
+
+
+class AdminSession(db.Model):
+    """Server-side admin session, used when Redis is not configured"""
+    __tablename__ = 'admin_sessions'
+
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)  # Serialized session dict
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<AdminSession expires {self.expires_at}>'
+
+
+class ClaimRollup(db.Model):
+    """Claim counts for one time bucket and dimension value, maintained by analytics.py"""
+    __tablename__ = 'claim_rollups'
+
+    # Key order matches the analytics query: one period and dimension over a bucket range
+    period = db.Column(db.String(8), primary_key=True)  # day, week or month
+    dimension = db.Column(db.String(20), primary_key=True)  # defect_reason, warranty_option or product
+    bucket = db.Column(db.Date, primary_key=True)  # First day of the period (UTC) the claims were created in
+    value = db.Column(db.String(200), primary_key=True)  # Dimension value
+    claims = db.Column(db.Integer, nullable=False, default=0)
+    pending = db.Column(db.Integer, nullable=False, default=0)
+    approved = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    approval_seconds = db.Column(db.BigInteger, nullable=False, default=0)  # Sum of created-to-approved times
+    rejection_seconds = db.Column(db.BigInteger, nullable=False, default=0)  # Sum of created-to-rejected times
+
+    def __repr__(self):
+        return f'<ClaimRollup {self.period} {self.bucket} {self.dimension}={self.value}>'
+
+
+class ArchivedClaim(db.Model):
+    """A closed claim moved out of warranty_claims by `flask claims archive`"""
+    __tablename__ = 'archived_claims'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Same id as in warranty_claims
+    reference_number = db.Column(db.String(64), unique=True, nullable=False)
+    email = db.Column(db.String(100), nullable=False, index=True)
+    product = db.Column(db.String(200), nullable=False)
+    defect_reason = db.Column(db.String(50), nullable=False)
+    warranty_option = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)  # When the claim was approved or rejected
+    file_path = db.Column(db.String(255), nullable=True)  # Storage key in the archive storage
+    file_name = db.Column(db.String(255), nullable=True)
+    thumbnail_path = db.Column(db.String(255), nullable=True)  # Storage key in the archive storage
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    data = db.Column(db.Text, nullable=False)  # JSON of the claim's to_dict() when it was archived
+
+    def __repr__(self):
+        return f'<ArchivedClaim {self.reference_number}>'
+
+    @classmethod
+    def from_claim(cls, claim, archived_at):
+        return cls(
+            id=claim.id,
+            reference_number=claim.reference_number,
+            email=claim.email,
+            product=claim.product,
+            defect_reason=claim.defect_reason,
+            warranty_option=claim.warranty_option,
+            status=claim.status,
+            created_at=claim.created_at,
+            updated_at=claim.updated_at,
+            file_path=claim.file_path,
+            file_name=claim.file_name,
+            thumbnail_path=claim.thumbnail_path,
+            archived_at=archived_at,
+            data=json.dumps(claim.to_dict())
+        )
+
+    def to_dict(self):
+        return dict(json.loads(self.data), archived_at=self.archived_at.isoformat())
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """Process-wide counters for connection checkouts from the pool"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_checkout(self, waited):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def record_timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkout_timeouts': self.timeouts,
+                'checkout_wait_seconds_total': round(self.wait_seconds_total, 6),
+                'checkout_wait_seconds_max': round(self.wait_seconds_max, 6),
+                'checkout_wait_seconds_avg': round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        pool_metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+def engine_options(database_uri, environ=os.environ):
+    """SQLALCHEMY_ENGINE_OPTIONS sized to this process's request concurrency.
+
+    Every gunicorn worker (or the waitress process) has its own pool, so the
+    pool only needs one connection per request thread (WEB_THREADS, set by
+    gunicorn_config.py and production.py), plus a little overflow for
+    background threads.
+    """
+    if database_uri.startswith('sqlite'):
+        return {}
+
+    threads = int(environ.get('WEB_THREADS', 1))
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(environ.get('DB_POOL_SIZE', threads)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 2)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+
+    statement_timeout = int(environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    if database_uri.startswith('postgres') and statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+
+    return options
+
+
+def pool_stats(engine):
+    """Current pool occupancy plus checkout counters for this process"""
+    pool = engine.pool
+    stats = {'pool_class': pool.__class__.__name__, 'pid': os.getpid()}
+
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'in_use': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout()
+        })
+
+    stats.update(pool_metrics.snapshot())
+    return stats
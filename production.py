@@ -1,7 +1,14 @@
-from waitress import serve
-from app import app
+import os
 import logging
 
+THREADS = int(os.environ.get('WEB_THREADS', 4))
+
+# The database pool is sized from WEB_THREADS when the app is created
+os.environ['WEB_THREADS'] = str(THREADS)
+
+from waitress import serve
+from app import create_app, init_database
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,5 +22,7 @@ logger = logging.getLogger(__name__)
 
 if __name__ == '__main__':
     logger.info('Starting Warranty Claims System in production mode...')
-    serve(app, host='0.0.0.0', port=5001, threads=4)
+    app = create_app()
+    init_database(app)
+    serve(app, host='0.0.0.0', port=5001, threads=THREADS)
     logger.info('Server started successfully.') 
\ No newline at end of file
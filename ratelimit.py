@@ -0,0 +1,244 @@
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from werkzeug.wsgi import ClosingIterator
+
+from metrics import REQUESTS_SHED
+
+logger = logging.getLogger(__name__)
+
+# Admission control runs in front of everything else, including
+# BufferRequestBody, so a refused request costs one counter update and its
+# body is never read:
+# - each client IP gets a token bucket per rate-limited route
+#   (RATE_LIMIT_SUBMIT, RATE_LIMIT_LOGIN)
+# - at most UPLOAD_CONCURRENCY claim submissions are in flight at once
+# Both are shared by all workers through Redis when REDIS_URL is set, and
+# kept per process otherwise. If Redis fails, requests are let through.
+
+RATE_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+SUBMIT_PATHS = ('/submit-claim', '/warranty-claim')
+LOGIN_PATH = '/admin/login'
+# A refused upload is usually admitted again within a few seconds
+UPLOAD_RETRY_AFTER = 2
+# Upload slots not released by then belonged to a killed worker
+UPLOAD_SLOT_TIMEOUT = 300
+
+
+def parse_rate(value):
+    """'5/minute' -> (5, 60); None for an empty value, which disables the limit"""
+    if not value:
+        return None
+    count, _, period = value.partition('/')
+    if period not in RATE_PERIODS or not count.isdigit() or int(count) < 1:
+        raise ValueError(f"Invalid rate limit {value!r}, expected e.g. '5/minute'")
+    return int(count), RATE_PERIODS[period]
+
+
+def client_ip(environ, proxy_count=0):
+    """The client address, taken from X-Forwarded-For when behind proxy_count trusted proxies"""
+    if proxy_count:
+        forwarded = [part.strip() for part in environ.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= proxy_count:
+            return forwarded[-proxy_count]
+    return environ.get('REMOTE_ADDR', '')
+
+
+class LocalBuckets:
+    """Token buckets in this process; the least recently used are dropped past max_entries"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, period):
+        """Take a token; returns 0 if one was available, else the seconds until one is"""
+        now = time.time()
+        with self.lock:
+            tokens, at = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - at) * capacity / period)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) * period / capacity
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+            return wait
+
+
+# Same algorithm as LocalBuckets.take, atomic in Redis. A bucket left alone
+# for a whole period is full again, so it can expire.
+TAKE_TOKEN_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or capacity
+local at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - at, 0) * capacity / period)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) * period / capacity
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(period * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared by all workers"""
+
+    def __init__(self, client, namespace='ratelimit:'):
+        self.namespace = namespace
+        self.script = client.register_script(TAKE_TOKEN_SCRIPT)
+
+    def take(self, key, capacity, period):
+        return float(self.script(keys=[self.namespace + key], args=[capacity, period, time.time()]))
+
+
+class LocalSlots:
+    """Upload slots in this process"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.in_use >= self.limit:
+                return None
+            self.in_use += 1
+            return True
+
+    def release(self, token):
+        with self.lock:
+            self.in_use -= 1
+
+
+# Slots are members of a sorted set scored by when they were taken, so slots
+# of a worker killed mid-upload are reclaimed after UPLOAD_SLOT_TIMEOUT
+ACQUIRE_SLOT_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+return 1
+"""
+
+
+class RedisSlots:
+    """Upload slots shared by all workers"""
+
+    def __init__(self, client, limit, key='ratelimit:uploads'):
+        self.client = client
+        self.limit = limit
+        self.key = key
+        self.script = client.register_script(ACQUIRE_SLOT_SCRIPT)
+
+    def acquire(self):
+        token = uuid.uuid4().hex
+        acquired = self.script(keys=[self.key], args=[time.time(), UPLOAD_SLOT_TIMEOUT, self.limit, token])
+        return token if acquired else None
+
+    def release(self, token):
+        self.client.zrem(self.key, token)
+
+
+class AdmissionControl:
+    """WSGI middleware that answers 429 with Retry-After before a request body is read"""
+
+    def __init__(self, app, rates, buckets, slots, upload_paths=SUBMIT_PATHS, proxy_count=0):
+        self.app = app
+        self.rates = rates  # POST path -> (capacity, period)
+        self.buckets = buckets
+        self.slots = slots  # None when uploads are not capped
+        self.upload_paths = upload_paths
+        self.proxy_count = proxy_count
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO')
+        if environ.get('REQUEST_METHOD') != 'POST':
+            return self.app(environ, start_response)
+
+        rate = self.rates.get(path)
+        if rate:
+            key = f"{path}:{client_ip(environ, self.proxy_count)}"
+            try:
+                wait = self.buckets.take(key, *rate)
+            except Exception as e:
+                logger.warning(f"Rate limiter unavailable, admitting request: {str(e)}")
+                wait = 0
+            if wait:
+                return self.refuse(start_response, path, 'rate', wait)
+
+        if self.slots is None or path not in self.upload_paths:
+            return self.app(environ, start_response)
+
+        try:
+            token = self.slots.acquire()
+        except Exception as e:
+            logger.warning(f"Upload slots unavailable, admitting request: {str(e)}")
+            return self.app(environ, start_response)
+        if token is None:
+            return self.refuse(start_response, path, 'concurrency', UPLOAD_RETRY_AFTER)
+
+        # The slot is held until the response has been sent
+        try:
+            response = self.app(environ, start_response)
+        except Exception:
+            self.release(token)
+            raise
+        return ClosingIterator(response, lambda: self.release(token))
+
+    def release(self, token):
+        try:
+            self.slots.release(token)
+        except Exception as e:
+            logger.warning(f"Failed to release upload slot: {str(e)}")
+
+    def refuse(self, start_response, path, reason, wait):
+        REQUESTS_SHED.labels(path, reason).inc()
+        start_response('429 Too Many Requests', [
+            ('Content-Type', 'text/plain'),
+            ('Retry-After', str(max(1, math.ceil(wait)))),
+            # The body is never read, so the connection cannot be reused
+            ('Connection', 'close')
+        ])
+        return [b'Too many requests, please try again shortly']
+
+
+def init_rate_limits(app, redis_client=None):
+    """Wrap the app in admission control; call after any other WSGI middleware"""
+    rates = {}
+    submit = parse_rate(app.config['RATE_LIMIT_SUBMIT'])
+    if submit:
+        rates.update({path: submit for path in SUBMIT_PATHS})
+    login = parse_rate(app.config['RATE_LIMIT_LOGIN'])
+    if login:
+        rates[LOGIN_PATH] = login
+
+    concurrency = app.config['UPLOAD_CONCURRENCY']
+    if redis_client is not None:
+        buckets = RedisBuckets(redis_client)
+        slots = RedisSlots(redis_client, concurrency) if concurrency else None
+    else:
+        buckets = LocalBuckets()
+        slots = LocalSlots(concurrency) if concurrency else None
+
+    if rates or slots:
+        app.wsgi_app = AdmissionControl(
+            app.wsgi_app, rates, buckets, slots, proxy_count=app.config['TRUSTED_PROXY_COUNT']
+        )
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Crockford base32: no ambiguous letters, and ASCII order matches numeric order
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+MS_DIGITS = 6   # milliseconds since midnight UTC (< 2^30)
+NODE_DIGITS = 2  # REFERENCE_NODE_ID, one per host (0-1023)
+PID_DIGITS = 5   # process id, unique among live processes on a host (< 2^25)
+SEQ_DIGITS = 2   # per-process sequence within one millisecond (0-1023)
+MAX_SEQUENCE = len(ALPHABET) ** SEQ_DIGITS
+
+
+def encode(value, digits):
+    chars = []
+    for _ in range(digits):
+        value, remainder = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[remainder])
+    if value:
+        raise ValueError(f"Value does not fit in {digits} base32 digits")
+    return ''.join(reversed(chars))
+
+
+class ReferenceGenerator:
+    """Time-ordered claim reference numbers, unique across processes and hosts.
+
+    A reference is WC-YYYYMMDD-<ms of day><node><pid><sequence>, all fixed
+    width, so references sort by creation time and new rows always land at the
+    end of the reference_number index. Uniqueness comes from the (node, pid)
+    pair plus a per-process sequence, not from retrying on the unique
+    constraint.
+    """
+
+    def __init__(self, prefix='WC', node_id=None):
+        self.prefix = prefix
+        # None until configured; read from the environment on first use, so
+        # a value loaded from .env after import is still seen
+        self.node_id = node_id
+        self.lock = threading.Lock()
+        self.last_ms = 0
+        self.sequence = 0
+
+    def next_timestamp(self):
+        """Next (ms since epoch, sequence) pair; never goes backwards within a process"""
+        with self.lock:
+            now = max(time.time_ns() // 1_000_000, self.last_ms)
+            if now == self.last_ms:
+                self.sequence += 1
+                if self.sequence >= MAX_SEQUENCE:
+                    # Sequence exhausted for this millisecond: move on to the next one
+                    now += 1
+                    self.sequence = 0
+            else:
+                self.sequence = 0
+            self.last_ms = now
+            return now, self.sequence
+
+    def generate(self):
+        if self.node_id is None:
+            self.node_id = int(os.environ.get('REFERENCE_NODE_ID', 0))
+        epoch_ms, sequence = self.next_timestamp()
+        moment = datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc)
+        ms_of_day = epoch_ms % 86_400_000
+        suffix = (
+            encode(ms_of_day, MS_DIGITS)
+            + encode(self.node_id, NODE_DIGITS)
+            + encode(os.getpid() % len(ALPHABET) ** PID_DIGITS, PID_DIGITS)
+            + encode(sequence, SEQ_DIGITS)
+        )
+        return f"{self.prefix}-{moment:%Y%m%d}-{suffix}"
+
+
+reference_generator = ReferenceGenerator()
+
+
+def init_references(app):
+    node_id = app.config.get('REFERENCE_NODE_ID')
+    if node_id is not None:
+        reference_generator.node_id = int(node_id)
+
+
+def generate_reference_number():
+    """Generate a unique reference number for the warranty claim"""
+    return reference_generator.generate()
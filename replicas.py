@@ -0,0 +1,193 @@
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+
+from pooling import engine_options
+
+logger = logging.getLogger(__name__)
+
+# Read-only admin routes (dashboard listing, claim view, search, export)
+# can read from replicas listed in DATABASE_REPLICA_URLS. A route
+# opts in with @read_replica, which picks a replica for the whole request.
+# Writes, flushes and SELECT ... FOR UPDATE always go to the primary, as do
+# requests without the decorator (submission, confirmation, CLI, worker).
+#
+# A replica is only used while its replication lag is under REPLICA_MAX_LAG
+# seconds; lag is measured at most every REPLICA_CHECK_INTERVAL seconds per
+# process. After an admin writes something, their session reads from the
+# primary for REPLICA_MAX_LAG seconds, so they see their own changes.
+PRIMARY_UNTIL_KEY = 'db_primary_until'
+
+# Seconds the replica is behind; 0 when it has replayed everything it received
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.lag = None  # None until measured, or after a failed check
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def measure_lag(self):
+        if self.engine.dialect.name != 'postgresql':
+            # No lag to measure (e.g. two local SQLite files); only check it answers
+            query, to_seconds = text('SELECT 1'), lambda value: 0.0
+        else:
+            query, to_seconds = POSTGRES_LAG_QUERY, float
+        with self.engine.connect() as connection:
+            return to_seconds(connection.execute(query).scalar())
+
+    def current_lag(self, check_interval):
+        """Replication lag in seconds, re-measured when older than check_interval; None if unreachable"""
+        if time.monotonic() - self.checked_at < check_interval:
+            return self.lag
+        # One request re-measures; the others use the last value meanwhile
+        if not self.lock.acquire(blocking=False):
+            return self.lag
+        try:
+            try:
+                self.lag = self.measure_lag()
+            except Exception as e:
+                logger.warning(f"Replica {self.engine.url.host or self.engine.url.database} unavailable: {str(e)}")
+                self.lag = None
+            self.checked_at = time.monotonic()
+            return self.lag
+        finally:
+            self.lock.release()
+
+
+class ReplicaSet:
+    """The configured replicas, handed out round-robin among those within the lag limit"""
+
+    def __init__(self, engines, max_lag, check_interval):
+        self.replicas = [Replica(engine) for engine in engines]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.counter = itertools.count()
+
+    def choose(self):
+        if not self.replicas:
+            return None
+        start = next(self.counter)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            lag = replica.current_lag(self.check_interval)
+            if lag is not None and lag <= self.max_lag:
+                return replica.engine
+        return None
+
+    def status(self):
+        """Each replica's lag, re-measured when older than check_interval"""
+        status = []
+        for replica in self.replicas:
+            lag = replica.current_lag(self.check_interval)
+            status.append({'lag_seconds': lag, 'available': lag is not None and lag <= self.max_lag})
+        return status
+
+
+def is_read(clause):
+    """Plain SELECTs can go to a replica; anything else might write"""
+    return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+
+class RoutingSession(Session):
+    """db.session: reads inside a @read_replica request go to its replica, everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            replica = g.get('db_replica')
+            if replica is not None and is_read(clause):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def current_replica():
+    """The replica engine this request reads from, or None for the primary"""
+    return g.get('db_replica') if has_request_context() else None
+
+
+def pinned_to_primary():
+    return time.time() < session.get(PRIMARY_UNTIL_KEY, 0)
+
+
+def read_replica(view):
+    """Let a read-only route read from a replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replicas = current_app.extensions['replicas']
+        if replicas.replicas and not pinned_to_primary():
+            g.db_replica = replicas.choose()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, even in a @read_replica request"""
+    if not has_request_context():
+        yield
+        return
+    replica = g.pop('db_replica', None)
+    try:
+        yield
+    finally:
+        if replica is not None:
+            g.db_replica = replica
+
+
+# A request that wrote to the primary pins the admin to it (see pin_writer)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def note_flush(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def note_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def note_committed_write(db_session):
+    if db_session.info.pop('wrote', False) and has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_write(db_session):
+    db_session.info.pop('wrote', None)
+
+
+def pin_writer(response):
+    # Only admins read from replicas, so customer cookies never carry the pin
+    replicas = current_app.extensions['replicas']
+    if replicas.replicas and g.get('db_wrote') and session.get('admin_authenticated'):
+        session[PRIMARY_UNTIL_KEY] = time.time() + replicas.max_lag
+    return response
+
+
+def create_replicas(config):
+    urls = [url.strip() for url in (config.get('DATABASE_REPLICA_URLS') or '').split(',') if url.strip()]
+    # Engines are lazy: nothing connects until a replica is first used
+    engines = [create_engine(url, **engine_options(url)) for url in urls]
+    return ReplicaSet(engines, config['REPLICA_MAX_LAG'], config['REPLICA_CHECK_INTERVAL'])
+
+
+def init_replicas(app):
+    app.extensions['replicas'] = create_replicas(app.config)
+    app.after_request(pin_writer)
@@ -0,0 +1,192 @@
+import base64
+import logging
+import re
+
+from sqlalchemy import Float, Integer, and_, false, func, inspect, literal_column, or_, select, text
+
+from models import db, WarrantyClaim
+from replicas import current_replica
+
+logger = logging.getLogger(__name__)
+
+# Full-text search over reference number, name, email, product and issue.
+#
+# Postgres: a generated tsvector column (warranty_claims.search_vector) with a
+# GIN index, added by the f4a3c9e1b7d2 migration.
+# SQLite: an external-content FTS5 table kept in sync by triggers, installed
+# at startup by install_search_index().
+# Anything else, or a database that has not been migrated yet, falls back to
+# ILIKE matching without ranking.
+
+MAX_SEARCH_TERMS = 8
+FTS_TABLE = 'warranty_claims_fts'
+
+# bm25 column weights, in FTS table column order: a hit on the reference
+# number or email matters more than one somewhere in the issue text
+SQLITE_WEIGHTS = '10.0, 5.0, 5.0, 3.0, 1.0'
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        reference_number, name, email, product, issue,
+        content='warranty_claims', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON warranty_claims BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, reference_number, name, email, product, issue)
+        VALUES (new.id, new.reference_number, new.name, new.email, new.product, new.issue);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON warranty_claims BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, reference_number, name, email, product, issue)
+        VALUES ('delete', old.id, old.reference_number, old.name, old.email, old.product, old.issue);
+    END""",
+    # Only the indexed columns: status changes do not touch the FTS index
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF reference_number, name, email, product, issue ON warranty_claims BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, reference_number, name, email, product, issue)
+        VALUES ('delete', old.id, old.reference_number, old.name, old.email, old.product, old.issue);
+        INSERT INTO {FTS_TABLE}(rowid, reference_number, name, email, product, issue)
+        VALUES (new.id, new.reference_number, new.name, new.email, new.product, new.issue);
+    END""",
+]
+
+# Untyped, so the Postgres dialect is only imported by Postgres deployments
+search_vector = literal_column('warranty_claims.search_vector')
+
+_backends = {}
+
+
+def install_search_index(engine):
+    """Create the SQLite FTS5 index and its triggers if they are missing"""
+    if engine.dialect.name != 'sqlite':
+        return
+    try:
+        with engine.begin() as conn:
+            created = not inspect(conn).has_table(FTS_TABLE)
+            for statement in SQLITE_DDL:
+                conn.execute(text(statement))
+            if created:
+                # Index the claims that existed before the FTS table
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+                logger.info("Built full-text search index")
+    except Exception as e:
+        logger.error(f"Could not install full-text search index: {str(e)}")
+    _backends.pop(engine, None)
+
+
+def search_backend():
+    """'postgresql', 'sqlite' or None when no full-text index is available on the database searched"""
+    # Searches are plain SELECTs, so in a @read_replica request they run on the replica
+    engine = current_replica()
+    if engine is None:
+        engine = db.engine
+    if engine not in _backends:
+        backend = None
+        try:
+            inspector = inspect(engine)
+            if engine.dialect.name == 'sqlite' and inspector.has_table(FTS_TABLE):
+                backend = 'sqlite'
+            elif engine.dialect.name == 'postgresql' and 'search_vector' in {
+                column['name'] for column in inspector.get_columns('warranty_claims')
+            }:
+                backend = 'postgresql'
+        except Exception as e:
+            logger.error(f"Could not inspect full-text search index: {str(e)}")
+        if backend is None:
+            logger.warning("No full-text search index found, falling back to ILIKE (run `flask db upgrade`)")
+        _backends[engine] = backend
+    return _backends[engine]
+
+
+def search_terms(search):
+    """Split a search string into terms, dropping ones without letters or digits"""
+    return [term for term in search.split() if re.search(r'\w', term)][:MAX_SEARCH_TERMS]
+
+
+def sqlite_match(terms):
+    # Each term is a quoted phrase (so "@", "-" and "." are tokenized, not
+    # parsed as FTS syntax) with a prefix marker for search-as-you-type
+    return ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+
+def postgres_tsquery(terms):
+    cleaned = [re.sub(r"[&|!():*'\\<>]", '', term) for term in terms]
+    query = ' & '.join(f"{term}:*" for term in cleaned if term)
+    return func.to_tsquery(literal_column("'simple'::regconfig"), query)
+
+
+def ilike_condition(terms):
+    return and_(*[
+        or_(
+            WarrantyClaim.reference_number.ilike(f"%{term}%"),
+            WarrantyClaim.name.ilike(f"%{term}%"),
+            WarrantyClaim.email.ilike(f"%{term}%"),
+            WarrantyClaim.product.ilike(f"%{term}%"),
+            WarrantyClaim.issue.ilike(f"%{term}%")
+        )
+        for term in terms
+    ])
+
+
+def sqlite_hits(terms):
+    return text(
+        f"SELECT rowid AS claim_id, bm25({FTS_TABLE}, {SQLITE_WEIGHTS}) AS score "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :terms"
+    ).bindparams(terms=sqlite_match(terms)).columns(claim_id=Integer, score=Float).subquery('search_hits')
+
+
+def match_condition(search):
+    """SQL condition matching claims against a search string, unranked"""
+    terms = search_terms(search)
+    if not terms:
+        # Nothing to search for matches nothing, never everything
+        return false()
+    backend = search_backend()
+    if backend == 'sqlite':
+        return WarrantyClaim.id.in_(select(sqlite_hits(terms).c.claim_id))
+    if backend == 'postgresql':
+        return search_vector.op('@@')(postgres_tsquery(terms))
+    return ilike_condition(terms)
+
+
+def encode_offset(offset):
+    return base64.urlsafe_b64encode(f"search|{offset}".encode()).decode()
+
+
+def decode_offset(cursor):
+    kind, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    if kind != 'search' or int(offset) < 0:
+        raise ValueError("Not a search cursor")
+    return int(offset)
+
+
+def search_claims(query, search, cursor=None, limit=50):
+    """Return one page of claims ranked by relevance and the cursor for the next page.
+
+    Scores change as claims are added, so pages are addressed by offset
+    rather than by a keyset.
+    """
+    terms = search_terms(search)
+    if not terms:
+        return [], None
+    offset = decode_offset(cursor) if cursor else 0
+
+    backend = search_backend()
+    if backend == 'sqlite':
+        hits = sqlite_hits(terms)
+        # bm25 is negative, lower is better
+        query = query.join(hits, WarrantyClaim.id == hits.c.claim_id).order_by(
+            hits.c.score, WarrantyClaim.id.desc()
+        )
+    elif backend == 'postgresql':
+        tsquery = postgres_tsquery(terms)
+        query = query.filter(search_vector.op('@@')(tsquery)).order_by(
+            func.ts_rank(search_vector, tsquery).desc(), WarrantyClaim.id.desc()
+        )
+    else:
+        query = query.filter(ilike_condition(terms)).order_by(
+            WarrantyClaim.created_at.desc(), WarrantyClaim.id.desc()
+        )
+
+    rows = query.offset(offset).limit(limit + 1).all()
+    next_cursor = encode_offset(offset + limit) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,207 @@
+import logging
+import secrets
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from jobs import enqueue
+from models import db, AdminSession
+from replicas import primary_reads
+
+logger = logging.getLogger(__name__)
+
+# Customers only ever carry a claim id and reference number, which fit in a
+# small signed cookie, so the public pages never touch a session store.
+# Admin sessions stay server-side, where they expire and can be revoked.
+SERVER_SESSION_PREFIXES = ('/admin', '/authorized')
+ADMIN_SESSION_COOKIE = 'admin_session'
+# Permanent sessions are extended as they are used. An unchanged session is
+# written back at most once per interval rather than on every admin request
+# (the dashboard's event stream reconnects every few seconds).
+SESSION_REFRESH_INTERVAL = timedelta(minutes=5)
+
+serializer = TaggedJSONSerializer()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session whose data lives in a server-side store, keyed by a random id"""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at  # When the stored copy expires
+        self.modified = False
+        self.rotated_from = None
+
+    def rotate(self):
+        """Move the data to a fresh id, e.g. on login, so an old id cannot be reused"""
+        if self.rotated_from is None and not self.new:
+            self.rotated_from = self.sid
+        self.sid = new_session_id()
+        self.modified = True
+
+
+def new_session_id():
+    return secrets.token_urlsafe(32)
+
+
+class RedisSessionStore:
+    """Sessions as Redis keys that expire on their own"""
+
+    def __init__(self, client, namespace='session:'):
+        self.client = client
+        self.namespace = namespace
+
+    def load(self, sid):
+        """(data, expires_at), or None"""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.namespace + sid)
+        pipe.ttl(self.namespace + sid)
+        data, ttl = pipe.execute()
+        if data is None:
+            return None
+        return data, datetime.utcnow() + timedelta(seconds=max(ttl, 0))
+
+    def save(self, sid, data, ttl):
+        self.client.set(self.namespace + sid, data, ex=ttl)
+
+    def delete(self, sid):
+        self.client.delete(self.namespace + sid)
+
+    def purge_expired(self):
+        return 0
+
+
+class DatabaseSessionStore:
+    """Sessions in the admin_sessions table; expired rows are purged by a job"""
+
+    def load(self, sid):
+        row = db.session.get(AdminSession, sid)
+        if row is None or row.expires_at < datetime.utcnow():
+            return None
+        return row.data, row.expires_at
+
+    def save(self, sid, data, ttl):
+        # merge() looks the row up first; a replica may not have it yet
+        with primary_reads():
+            db.session.merge(AdminSession(id=sid, data=data, expires_at=datetime.utcnow() + ttl))
+        db.session.commit()
+
+    def delete(self, sid):
+        AdminSession.query.filter_by(id=sid).delete()
+        db.session.commit()
+
+    def purge_expired(self):
+        removed = AdminSession.query.filter(AdminSession.expires_at < datetime.utcnow()).delete()
+        db.session.commit()
+        return removed
+
+
+class HybridSessionInterface(SessionInterface):
+    """Signed-cookie sessions on public pages, server-side sessions for admin pages"""
+
+    def __init__(self, store):
+        self.store = store
+        self.cookie_interface = SecureCookieSessionInterface()
+
+    def is_server_request(self, request):
+        return request.path.startswith(SERVER_SESSION_PREFIXES)
+
+    def open_session(self, app, request):
+        if not self.is_server_request(request):
+            return self.cookie_interface.open_session(app, request)
+
+        sid = request.cookies.get(ADMIN_SESSION_COOKIE)
+        if sid:
+            try:
+                stored = self.store.load(sid)
+            except Exception as e:
+                logger.error(f"Session store read failed: {str(e)}")
+                stored = None
+            if stored is not None:
+                data, expires_at = stored
+                return ServerSession(serializer.loads(data), sid=sid, expires_at=expires_at)
+        return ServerSession(sid=new_session_id(), new=True)
+
+    def needs_refresh(self, app, session):
+        """True once an unchanged session was last saved more than SESSION_REFRESH_INTERVAL ago"""
+        if session.expires_at is None:
+            return True
+        lifetime = app.permanent_session_lifetime
+        remaining = session.expires_at - datetime.utcnow()
+        return remaining < lifetime - min(SESSION_REFRESH_INTERVAL, lifetime / 2)
+
+    def save_session(self, app, session, response):
+        if not isinstance(session, ServerSession):
+            return self.cookie_interface.save_session(app, session, response)
+
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        try:
+            if session.rotated_from:
+                self.store.delete(session.rotated_from)
+
+            if not session:
+                if session.modified and not session.new:
+                    self.store.delete(session.sid)
+                    response.delete_cookie(ADMIN_SESSION_COOKIE, domain=domain, path=path)
+                return
+
+            if not self.should_set_cookie(app, session):
+                return
+
+            if not session.modified and not self.needs_refresh(app, session):
+                return
+
+            self.store.save(session.sid, serializer.dumps(dict(session)), app.permanent_session_lifetime)
+        except Exception as e:
+            logger.error(f"Session store write failed: {str(e)}")
+            return
+
+        response.set_cookie(
+            ADMIN_SESSION_COOKIE,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def create_session_store(redis_client=None):
+    """Use Redis when it is configured, otherwise the database"""
+    if redis_client is not None:
+        return RedisSessionStore(redis_client)
+    return DatabaseSessionStore()
+
+
+def schedule_session_purge(app):
+    """Queue a purge for when a session created now would have expired"""
+    if isinstance(app.session_interface.store, DatabaseSessionStore):
+        enqueue('purge_expired_sessions', delay=app.permanent_session_lifetime.total_seconds())
+
+
+sessions_cli = AppGroup('sessions', help='Admin session store.')
+
+
+@sessions_cli.command('purge')
+@with_appcontext
+def purge_command():
+    """Delete expired admin sessions."""
+    removed = current_app.session_interface.store.purge_expired()
+    click.echo(f"Removed {removed} expired sessions")
+
+
+def init_sessions(app, redis_client=None):
+    app.session_interface = HybridSessionInterface(create_session_store(redis_client))
+    app.cli.add_command(sessions_cli)
@@ -0,0 +1,195 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+# Uploads are read and hashed in chunks so memory use does not depend on file size
+CHUNK_SIZE = 64 * 1024
+
+
+def make_key(digest, filename):
+    """Build the content-addressed storage key for a file"""
+    extension = os.path.splitext(filename)[1].lower()
+    return f"{digest[:2]}/{digest}{extension}"
+
+
+def key_digest(key):
+    """Return the content hash embedded in a storage key"""
+    return os.path.splitext(os.path.basename(key))[0]
+
+
+def is_relative_key(key):
+    """True for a key that stays inside the storage root"""
+    if not key or os.path.isabs(key):
+        return False
+    return os.path.normpath(key).split(os.sep)[0] != '..'
+
+
+def copy_and_hash(stream, destination):
+    """Copy a stream into a file object in chunks, returning its SHA-256 hex digest"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        destination.write(chunk)
+    return digest.hexdigest()
+
+
+class LocalStorage:
+    """Stores uploads on local disk under UPLOAD_FOLDER"""
+
+    def __init__(self, root):
+        # Created on first save, not here: building the app (e.g. for
+        # `flask assets build`) may run before the upload disk is mounted
+        self.root = os.path.abspath(root)
+
+    def save(self, stream, filename):
+        os.makedirs(self.root, exist_ok=True)
+        # Write to a temporary file in the same directory so the final move is atomic
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                key = make_key(copy_and_hash(stream, tmp), filename)
+
+            path = self.local_path(key)
+            try:
+                # Marks an existing copy as in use again (see uploads.remove_unreferenced)
+                os.utime(path)
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return key
+
+    def exists(self, key):
+        return is_relative_key(key) and os.path.isfile(self.local_path(key))
+
+    def open(self, key):
+        return open(self.local_path(key), 'rb')
+
+    def modified_at(self, key):
+        """When the file was last saved, in seconds since the epoch"""
+        return os.path.getmtime(self.local_path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key):
+        if not is_relative_key(key):
+            # e.g. an absolute path stored by a claim from before the storage layer
+            raise ValueError(f"Not a storage key: {key!r}")
+        return os.path.join(self.root, key)
+
+    def url(self, key, download_name):
+        return None
+
+
+class S3Storage:
+    """Stores uploads in an S3-compatible bucket (AWS S3, MinIO, ...)"""
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, storage_class=None):
+        import boto3  # Optional dependency, only needed for the S3 backend
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.storage_class = storage_class  # e.g. STANDARD_IA for archived uploads
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+
+    def object_name(self, key):
+        return f"{self.prefix}{key}"
+
+    def save(self, stream, filename):
+        # The key depends on the content hash, so spool the upload before sending it
+        with tempfile.TemporaryFile() as tmp:
+            key = make_key(copy_and_hash(stream, tmp), filename)
+            extra_args = {'StorageClass': self.storage_class} if self.storage_class else {}
+            existing = self.head(key)
+            if existing is None:
+                tmp.seek(0)
+                extra_args['ContentType'] = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+                self.client.upload_fileobj(tmp, self.bucket, self.object_name(key), ExtraArgs=extra_args)
+            else:
+                # Copying the object onto itself refreshes LastModified, which
+                # marks it as in use again (see uploads.remove_unreferenced).
+                # REPLACE drops whatever is not passed again, so keep the type and metadata.
+                self.client.copy_object(
+                    Bucket=self.bucket, Key=self.object_name(key), MetadataDirective='REPLACE',
+                    CopySource={'Bucket': self.bucket, 'Key': self.object_name(key)},
+                    ContentType=existing.get('ContentType') or 'application/octet-stream',
+                    Metadata=existing.get('Metadata') or {}, **extra_args
+                )
+        return key
+
+    def head(self, key):
+        """The object's HEAD response, or None if it does not exist"""
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.object_name(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self.head(key) is not None
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self.object_name(key))['Body']
+
+    def modified_at(self, key):
+        return self.client.head_object(Bucket=self.bucket, Key=self.object_name(key))['LastModified'].timestamp()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_name(key))
+
+    def local_path(self, key):
+        return None
+
+    def url(self, key, download_name, expires_in=300):
+        """Short-lived presigned URL, so the bucket serves the download directly"""
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': self.object_name(key),
+                'ResponseContentDisposition': f'attachment; filename="{download_name}"'
+            },
+            ExpiresIn=expires_in
+        )
+
+
+def create_storage(config):
+    """Create the storage backend selected by STORAGE_BACKEND"""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'])
+    if backend == 's3':
+        return S3Storage(
+            config['S3_BUCKET'],
+            prefix=config.get('S3_PREFIX', ''),
+            endpoint_url=config.get('S3_ENDPOINT_URL')
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def create_archive_storage(config):
+    """Create the cold storage that archived claims' uploads are moved to"""
+    backend = config.get('ARCHIVE_STORAGE_BACKEND') or config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config['ARCHIVE_FOLDER'])
+    if backend == 's3':
+        return S3Storage(
+            config.get('ARCHIVE_S3_BUCKET') or config['S3_BUCKET'],
+            prefix=config.get('ARCHIVE_S3_PREFIX', 'archive/'),
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            storage_class=config.get('ARCHIVE_S3_STORAGE_CLASS') or None
+        )
+    raise ValueError(f"Unknown archive storage backend: {backend}")
@@ -0,0 +1,89 @@
+import logging
+
+from flask import current_app, render_template
+from flask_mail import Mail, Message
+
+from jobs import task
+from models import db, WarrantyClaim
+from uploads import process_claim_upload, remove_unreferenced
+
+logger = logging.getLogger(__name__)
+
+mail = Mail()
+
+
+def claim_details(claim):
+    return {
+        'product': claim.product,
+        'purchase_date': claim.purchase_date,
+        'issue': claim.issue,
+        'defect_reason': claim.defect_reason,
+        'warranty_option': claim.warranty_option
+    }
+
+
+@task()
+def send_confirmation_email(claim_id):
+    """Email the customer a confirmation of their submitted claim"""
+    claim = db.session.get(WarrantyClaim, claim_id)
+    if claim is None:
+        logger.warning(f"Claim {claim_id} no longer exists, skipping confirmation email")
+        return
+
+    message = Message(
+        subject=f"Warranty claim received - {claim.reference_number}",
+        recipients=[claim.email],
+        html=render_template(
+            'email/confirmation.html',
+            name=claim.name,
+            reference_number=claim.reference_number,
+            claim_details=claim_details(claim)
+        )
+    )
+    mail.send(message)
+    logger.info(f"Confirmation email sent for claim {claim.reference_number}")
+
+
+@task()
+def notify_admins(claim_id):
+    """Let the admin team know a new claim is waiting for review"""
+    recipients = current_app.config.get('ADMIN_NOTIFY_EMAILS')
+    if not recipients:
+        return
+
+    claim = db.session.get(WarrantyClaim, claim_id)
+    if claim is None:
+        return
+
+    message = Message(
+        subject=f"New warranty claim {claim.reference_number}",
+        recipients=recipients,
+        body=(
+            f"A new warranty claim is waiting for review.\n\n"
+            f"Reference: {claim.reference_number}\n"
+            f"Customer: {claim.name} <{claim.email}>\n"
+            f"Product: {claim.product}\n"
+            f"Defect reason: {claim.defect_reason}\n"
+        )
+    )
+    mail.send(message)
+
+
+@task()
+def process_upload(claim_id):
+    """Downscale a claim's photo and make the thumbnail shown to admins"""
+    process_claim_upload(claim_id)
+
+
+@task()
+def remove_upload(key):
+    """Delete an upload that no claim refers to any more"""
+    remove_unreferenced(current_app.extensions['storage'], key)
+
+
+@task()
+def purge_expired_sessions():
+    """Delete admin sessions that have passed their expiry time"""
+    removed = current_app.session_interface.store.purge_expired()
+    if removed:
+        logger.info(f"Purged {removed} expired admin sessions")
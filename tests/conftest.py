@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+# The app is a set of top-level modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Builds the app on a fresh SQLite database, with no Redis and no rate limits"""
+    from app import create_app, init_database
+    from models import db
+
+    apps = []
+
+    def make_app(**config):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'claims.db'}",
+            'REDIS_URL': None,
+            'DATABASE_REPLICA_URLS': None,
+            'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+            'ARCHIVE_FOLDER': str(tmp_path / 'archive'),
+            'STORAGE_BACKEND': 'local',
+            'ARCHIVE_STORAGE_BACKEND': None,
+            'ADMIN_USERNAME': 'admin',
+            'ADMIN_PASSWORD': 'secret',
+            'RATE_LIMIT_SUBMIT': '',
+            'RATE_LIMIT_LOGIN': '',
+            'UPLOAD_CONCURRENCY': 0,
+            **config
+        })
+        init_database(app)
+        apps.append(app)
+        return app
+
+    yield make_app
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    response = client.post('/admin/login', data={'username': 'admin', 'password': 'secret'})
+    assert response.status_code == 302
+    return client
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+from analytics import bucket_range, claim_analytics, rebuild_rollups
+from app import transition_claims
+from models import db, ClaimRollup, WarrantyClaim
+
+
+def add_claim(i, defect_reason, product):
+    claim = WarrantyClaim(
+        reference_number=f'TEST-{i}', name='Alice', email=f'alice{i}@example.com', phone='5550000000',
+        product=product, purchase_date='2026-01-01', issue='Stopped working',
+        defect_reason=defect_reason, warranty_option='repair'
+    )
+    db.session.add(claim)
+    db.session.commit()
+    return claim.id
+
+
+def rollups():
+    return sorted(
+        (row.period, row.dimension, row.bucket, row.value, row.claims, row.pending, row.approved, row.rejected)
+        for row in ClaimRollup.query
+    )
+
+
+def test_totals_are_summed_from_the_defect_reason_rows(app):
+    with app.app_context():
+        first = add_claim(1, 'manufacturing', 'Blender')
+        add_claim(2, 'manufacturing', 'Kettle')
+        add_claim(3, 'damage', 'Kettle')
+        transition_claims('approved', [WarrantyClaim.id == first])
+        db.session.commit()
+
+        assert ClaimRollup.query.filter_by(dimension='all').count() == 0
+        first_bucket, last_bucket = bucket_range('month')
+        totals = claim_analytics('month', 'all', first_bucket, last_bucket)
+        assert totals['values'] == [{
+            'value': '', 'claims': 3, 'pending': 2, 'approved': 1, 'rejected': 0,
+            'avg_approval_hours': 0.0, 'avg_rejection_hours': None
+        }]
+        by_reason = claim_analytics('month', 'defect_reason', first_bucket, last_bucket)
+        assert {value['value']: value['claims'] for value in by_reason['values']} == {'manufacturing': 2, 'damage': 1}
+
+
+def test_incremental_rollups_match_a_rebuild(app):
+    with app.app_context():
+        for i, reason in enumerate(['manufacturing', 'damage', 'manufacturing']):
+            add_claim(i, reason, 'Kettle')
+        transition_claims('rejected', [WarrantyClaim.reference_number == 'TEST-1'])
+        db.session.commit()
+
+        incremental = rollups()
+        rebuild_rollups()
+        assert rollups() == incremental
@@ -0,0 +1,35 @@
+import pytest
+
+from models import db, WarrantyClaim
+
+BULK_URL = '/authorized/management/admin/bulk-status'
+
+
+@pytest.fixture
+def claims(app):
+    with app.app_context():
+        for i, product in enumerate(['Blender', 'Toaster', 'Kettle']):
+            db.session.add(WarrantyClaim(
+                reference_number=f'TEST-{i}', name=f'Customer {i}', email=f'customer{i}@example.com',
+                phone='5550000000', product=product, purchase_date='2026-01-01',
+                issue='Stopped working', defect_reason='manufacturing', warranty_option='repair'
+            ))
+        db.session.commit()
+
+
+def statuses(app):
+    with app.app_context():
+        return dict(db.session.query(WarrantyClaim.product, WarrantyClaim.status).all())
+
+
+@pytest.mark.parametrize('search', ['---', '  ', '@ !'])
+def test_filter_without_terms_changes_nothing(app, admin_client, claims, search):
+    response = admin_client.post(BULK_URL, json={'action': 'reject', 'filter': {'q': search}})
+    assert response.status_code == 400
+    assert set(statuses(app).values()) == {'pending'}
+
+
+def test_filter_changes_only_matching_claims(app, admin_client, claims):
+    response = admin_client.post(BULK_URL, json={'action': 'approve', 'filter': {'q': 'toaster'}})
+    assert response.get_json()['updated'] == 1
+    assert statuses(app) == {'Blender': 'pending', 'Toaster': 'approved', 'Kettle': 'pending'}
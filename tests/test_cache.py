@@ -0,0 +1,57 @@
+from sqlalchemy import update
+
+from app import transition_claims
+from cache import claim_cache, claim_key, STATUS_COUNTS_KEY
+from models import db, WarrantyClaim
+
+
+def add_claims(count):
+    claims = [
+        WarrantyClaim(
+            reference_number=f'TEST-{i}', name='Alice', email='alice@example.com', phone='5550000000',
+            product='Blender', purchase_date='2026-01-01', issue='Stopped working',
+            defect_reason='manufacturing', warranty_option='repair'
+        )
+        for i in range(count)
+    ]
+    db.session.add_all(claims)
+    db.session.commit()
+    return [claim.id for claim in claims]
+
+
+def fill_cache(claim_ids):
+    for claim_id in claim_ids:
+        claim_cache.get_or_load(claim_key(claim_id), lambda: {'id': claim_id})
+    claim_cache.get_or_load(STATUS_COUNTS_KEY, lambda: {'pending': len(claim_ids)})
+
+
+def cached(key):
+    return claim_cache.backend.get(key) is not None
+
+
+def test_transition_invalidates_only_the_changed_claims(app):
+    with app.app_context():
+        first, second = add_claims(2)
+        fill_cache([first, second])
+
+        transition_claims('approved', [WarrantyClaim.id == first])
+        # Nothing is dropped until the transaction commits
+        assert cached(claim_key(first))
+        db.session.commit()
+
+        assert not cached(claim_key(first))
+        assert not cached(STATUS_COUNTS_KEY)
+        assert cached(claim_key(second))
+
+
+def test_other_bulk_updates_drop_every_cached_claim(app):
+    with app.app_context():
+        first, second = add_claims(2)
+        fill_cache([first, second])
+
+        db.session.execute(
+            update(WarrantyClaim).where(WarrantyClaim.id == first).values(name='Bob'),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        assert not cached(claim_key(first)) and not cached(claim_key(second))
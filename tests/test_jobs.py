@@ -0,0 +1,119 @@
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from jobs import DatabaseQueue, Job, enqueue, run_worker
+from models import db, BackgroundJob, WarrantyClaim
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: every message is accepted and kept"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost SMTP stand-in')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith('RCPT TO:'):
+                recipients.append(line.decode().strip()[len('RCPT TO:'):])
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                for data in self.rfile:
+                    if data.rstrip(b'\r\n') == b'.':
+                        break
+                    body.append(data)
+                self.server.messages.append((recipients, b''.join(body).decode()))
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:  # MAIL FROM, RSET, NOOP
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mail_app(make_app, smtp_server):
+    return make_app(
+        MAIL_SERVER='127.0.0.1',
+        MAIL_PORT=smtp_server.server_address[1],
+        MAIL_SUPPRESS_SEND=False,
+        ADMIN_NOTIFY_EMAILS=[]
+    )
+
+
+def add_claim():
+    claim = WarrantyClaim(
+        reference_number='TEST-1', name='Alice', email='alice@example.com', phone='5550000000',
+        product='Blender', purchase_date='2026-01-01', issue='Stopped working',
+        defect_reason='manufacturing', warranty_option='repair'
+    )
+    db.session.add(claim)
+    db.session.commit()
+    return claim.id
+
+
+def test_worker_delivers_a_queued_email_once(mail_app, smtp_server):
+    with mail_app.app_context():
+        enqueue('send_confirmation_email', claim_id=add_claim())
+        queue = mail_app.extensions['job_queue']
+        run_worker(queue, burst=True)
+        # A second worker finds nothing left to do
+        run_worker(DatabaseQueue(), burst=True)
+        assert BackgroundJob.query.one().status == 'done'
+
+    assert len(smtp_server.messages) == 1
+    recipients, message = smtp_server.messages[0]
+    assert recipients == ['<alice@example.com>']
+    assert 'TEST-1' in message
+
+
+def test_only_one_worker_claims_a_job(app):
+    with app.app_context():
+        first, second = DatabaseQueue(), DatabaseQueue()
+        first.enqueue(Job('send_confirmation_email', {'claim_id': 1}))
+        # Both workers read the job before either claims it (as SQLite allows)
+        candidates = [(job.id, job.attempts, job.run_at) for job in first.due_jobs()]
+        assert len(candidates) == 1
+        job_id, attempts, run_at = candidates[0]
+        job = Job('send_confirmation_email', {'claim_id': 1}, id=job_id, attempts=attempts)
+
+        assert first.claim(job, run_at) is True
+        assert second.claim(job, run_at) is False
+        assert second.claim_next() is None
+
+
+def test_abandoned_job_is_requeued(app):
+    with app.app_context():
+        queue = DatabaseQueue(visibility_timeout=60)
+        queue.enqueue(Job('send_confirmation_email', {'claim_id': 1}))
+        job = queue.claim_next()
+        queue.requeue_abandoned()
+        assert db.session.get(BackgroundJob, job.id).status == 'running'
+
+        BackgroundJob.query.filter_by(id=job.id).update({'claimed_at': datetime.utcnow() - timedelta(minutes=5)})
+        db.session.commit()
+        queue.requeue_abandoned()
+        row = db.session.get(BackgroundJob, job.id)
+        assert (row.status, row.attempts) == ('queued', 1)
@@ -0,0 +1,53 @@
+import pytest
+
+from ratelimit import UPLOAD_SLOT_TIMEOUT, LocalBuckets, RedisBuckets, RedisSlots
+
+fakeredis = pytest.importorskip('fakeredis')
+# fakeredis runs Lua scripts through lupa
+pytest.importorskip('lupa')
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+
+def test_redis_bucket_allows_capacity_then_waits(client):
+    buckets = RedisBuckets(client)
+    assert buckets.take('submit:1.2.3.4', 2, 60) == 0
+    assert buckets.take('submit:1.2.3.4', 2, 60) == 0
+    wait = buckets.take('submit:1.2.3.4', 2, 60)
+    # One token comes back every 30 seconds
+    assert 29 < wait <= 30
+    # Other clients have their own bucket
+    assert buckets.take('submit:5.6.7.8', 2, 60) == 0
+
+
+def test_redis_bucket_matches_local_bucket(client):
+    redis_buckets, local_buckets = RedisBuckets(client), LocalBuckets()
+    for _ in range(4):
+        assert (redis_buckets.take('k', 3, 60) == 0) == (local_buckets.take('k', 3, 60) == 0)
+
+
+def test_redis_bucket_expires_after_period(client):
+    RedisBuckets(client).take('k', 5, 60)
+    assert 0 < client.pttl('ratelimit:k') <= 60000
+
+
+def test_redis_slots_cap_concurrency(client):
+    slots = RedisSlots(client, 2)
+    first, second = slots.acquire(), slots.acquire()
+    assert first and second and first != second
+    assert slots.acquire() is None
+
+    slots.release(first)
+    assert slots.acquire() is not None
+
+
+def test_redis_slots_reclaim_abandoned_slots(client):
+    slots = RedisSlots(client, 1)
+    assert slots.acquire() is not None
+    # A slot taken longer ago than the timeout belonged to a killed worker
+    token = client.zrange(slots.key, 0, -1)[0]
+    client.zadd(slots.key, {token: client.zscore(slots.key, token) - UPLOAD_SLOT_TIMEOUT - 1})
+    assert slots.acquire() is not None
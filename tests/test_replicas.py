@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from models import db, WarrantyClaim
+
+
+def new_claim(reference, product):
+    return WarrantyClaim(
+        reference_number=reference, name='Alice', email='alice@example.com', phone='5550000000',
+        product=product, purchase_date='2026-01-01', issue=f'The {product.lower()} stopped working',
+        defect_reason='manufacturing', warranty_option='repair'
+    )
+
+
+@pytest.fixture
+def replicated(make_app, tmp_path):
+    """A primary and a replica SQLite file that hold different claims, so reads show where they went"""
+    app = make_app(
+        DATABASE_REPLICA_URLS=f"sqlite:///{tmp_path / 'replica.db'}",
+        # No lag to wait out, and no read-your-writes pin after a write
+        REPLICA_MAX_LAG=0
+    )
+    replica = app.extensions['replicas'].replicas[0].engine
+    # The replica has the tables but, unlike the primary, no full-text index
+    db.metadata.create_all(replica)
+    with app.app_context():
+        db.session.add(new_claim('PRIMARY-1', 'Blender'))
+        db.session.commit()
+    with Session(replica) as replica_session:
+        replica_session.add(new_claim('REPLICA-1', 'Kettle'))
+        replica_session.commit()
+    return app, replica
+
+
+def test_admin_reads_go_to_the_replica(replicated):
+    app, replica = replicated
+    client = app.test_client()
+    client.post('/admin/login', data={'username': 'admin', 'password': 'secret'})
+
+    listing = client.get('/admin/api/claims').get_json()
+    assert [claim['reference_number'] for claim in listing['claims']] == ['REPLICA-1']
+
+    # Searched on the replica, which falls back to ILIKE without the index
+    found = client.get('/admin/api/claims/search?q=kettle').get_json()
+    assert [claim['reference_number'] for claim in found['claims']] == ['REPLICA-1']
+
+
+def test_writes_go_to_the_primary(replicated):
+    app, replica = replicated
+    client = app.test_client()
+    client.post('/admin/login', data={'username': 'admin', 'password': 'secret'})
+    with app.app_context():
+        claim_id = WarrantyClaim.query.filter_by(reference_number='PRIMARY-1').one().id
+
+    response = client.post(f'/authorized/management/admin/approve/{claim_id}')
+    assert response.get_json()['success'] is True
+    with app.app_context():
+        assert db.session.get(WarrantyClaim, claim_id).status == 'approved'
+    with Session(replica) as replica_session:
+        assert replica_session.get(WarrantyClaim, claim_id).status == 'pending'
+
+
+def test_health_checks_primary_and_replicas(replicated):
+    app, replica = replicated
+    health = app.test_client().get('/health')
+    assert health.status_code == 200
+    assert health.get_json()['replicas'] == [{'lag_seconds': 0.0, 'available': True}]
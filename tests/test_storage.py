@@ -0,0 +1,65 @@
+import io
+
+import pytest
+
+from storage import LocalStorage, S3Storage
+
+PDF = b'%PDF-1.4 receipt'
+
+
+def test_local_storage_saves_once_per_content(tmp_path):
+    storage = LocalStorage(tmp_path / 'uploads')
+    key = storage.save(io.BytesIO(PDF), 'receipt.PDF')
+    assert key.endswith('.pdf')
+    assert storage.save(io.BytesIO(PDF), 'other-name.pdf') == key
+    assert storage.save(io.BytesIO(PDF + b'!'), 'receipt.pdf') != key
+    with storage.open(key) as f:
+        assert f.read() == PDF
+
+
+def test_local_storage_rejects_paths_outside_its_root(tmp_path):
+    storage = LocalStorage(tmp_path / 'uploads')
+    assert not storage.exists('/etc/passwd')
+    assert not storage.exists('../claims.db')
+    with pytest.raises(ValueError):
+        storage.local_path('/etc/passwd')
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    moto = pytest.importorskip('moto')
+    for name, value in (('AWS_ACCESS_KEY_ID', 'test'), ('AWS_SECRET_ACCESS_KEY', 'test'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        yield
+
+
+def make_s3_storage(**kwargs):
+    storage = S3Storage('claims', prefix='uploads/', **kwargs)
+    storage.client.create_bucket(Bucket='claims')
+    return storage
+
+
+def test_s3_storage_saves_once_per_content_and_keeps_its_type(s3):
+    storage = make_s3_storage()
+    key = storage.save(io.BytesIO(PDF), 'receipt.pdf')
+    assert storage.head(key)['ContentType'] == 'application/pdf'
+
+    # Saving the same content again only refreshes the existing object
+    assert storage.save(io.BytesIO(PDF), 'copy.pdf') == key
+    assert storage.client.list_objects_v2(Bucket='claims')['KeyCount'] == 1
+    assert storage.head(key)['ContentType'] == 'application/pdf'
+    assert storage.open(key).read() == PDF
+
+    storage.delete(key)
+    assert not storage.exists(key)
+
+
+def test_s3_archive_storage_keeps_its_storage_class(s3):
+    storage = make_s3_storage(storage_class='STANDARD_IA')
+    key = storage.save(io.BytesIO(PDF), 'receipt.pdf')
+    storage.save(io.BytesIO(PDF), 'receipt.pdf')
+    head = storage.head(key)
+    assert head['StorageClass'] == 'STANDARD_IA'
+    assert head['ContentType'] == 'application/pdf'
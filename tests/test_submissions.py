@@ -0,0 +1,35 @@
+from models import db, WarrantyClaim
+
+
+def claim_form(name, email, key):
+    return {
+        'name': name, 'email': email, 'phone': '5550000000', 'product': 'Blender',
+        'purchase_date': '2026-01-01', 'issue': f'{name} reports the motor stopped',
+        'defect-reason': 'manufacturing', 'warranty-option': 'repair', 'idempotency_key': key
+    }
+
+
+def claim_count(app):
+    with app.app_context():
+        return db.session.query(WarrantyClaim).count()
+
+
+def test_resubmitted_key_replays_the_claim(app):
+    client = app.test_client()
+    client.post('/submit-claim', data=claim_form('Alice', 'alice@example.com', 'key-0123456789'))
+    response = client.post('/submit-claim', data=claim_form('Alice', 'alice@example.com', 'key-0123456789'))
+    assert response.status_code == 302 and response.location.endswith('/confirmation')
+    assert claim_count(app) == 1
+
+
+def test_key_reused_by_another_customer_does_not_reveal_the_claim(app):
+    app.test_client().post('/submit-claim', data=claim_form('Alice', 'alice@example.com', 'key-0123456789'))
+
+    client = app.test_client()
+    client.post('/submit-claim', data=claim_form('Mallory', 'mallory@example.com', 'key-0123456789'))
+    page = client.get('/confirmation').get_data(as_text=True)
+    assert claim_count(app) == 2
+    with app.app_context():
+        claims = {claim.email: claim.reference_number for claim in WarrantyClaim.query}
+    assert claims['mallory@example.com'] in page
+    assert claims['alice@example.com'] not in page
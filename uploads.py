@@ -0,0 +1,247 @@
+import io
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import or_, update
+
+from jobs import enqueue
+from models import db, WarrantyClaim
+
+logger = logging.getLogger(__name__)
+
+# Uploads are processed by the job worker after the claim is saved, never
+# during the request:
+# - photos (JPG/PNG) are turned upright, stripped of metadata and downscaled
+#   to IMAGE_MAX_SIZE; the result replaces the original when it is smaller
+# - images and the first page of PDFs get a JPEG thumbnail for the admin
+#   claim modal
+# Derivatives are saved through the storage layer like any upload, so they
+# are content-addressed and live next to the originals.
+# Pillow and pypdfium2 are imported on use, so web workers never load them.
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+PDF_EXTENSIONS = {'.pdf'}
+IMAGE_MAX_SIZE = 2048  # Longest side of a stored photo, in pixels
+THUMBNAIL_SIZE = 320  # Longest side of a thumbnail, in pixels
+JPEG_QUALITY = 85
+THUMBNAIL_QUALITY = 75
+# Seconds an upload must go unsaved before it may be deleted; see remove_unreferenced
+REMOVAL_GRACE = 3600
+
+
+def key_extension(key):
+    return os.path.splitext(key)[1].lower()
+
+
+def is_processable(key):
+    return key_extension(key) in IMAGE_EXTENSIONS | PDF_EXTENSIONS
+
+
+@contextmanager
+def local_copy(storage, key):
+    """A path on disk holding the upload, downloading it first for remote storage"""
+    path = storage.local_path(key)
+    if path is not None:
+        yield path
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=key_extension(key)) as tmp:
+        source = storage.open(key)
+        try:
+            shutil.copyfileobj(source, tmp)
+        finally:
+            source.close()
+        tmp.flush()
+        yield tmp.name
+
+
+def encode(image, fmt, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    buffer.seek(0)
+    return buffer
+
+
+def flatten(image):
+    """RGB copy of an image, with any transparency on a white background"""
+    from PIL import Image
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def load_image(path):
+    """Decode an image upright, decoding JPEGs at reduced size when they are much larger than needed"""
+    from PIL import Image, ImageOps
+
+    image = Image.open(path)
+    fmt = image.format
+    # JPEG can decode directly at 1/2, 1/4 or 1/8 scale, which is far cheaper
+    # than decoding a full phone photo and resizing it
+    image.draft('RGB', (IMAGE_MAX_SIZE, IMAGE_MAX_SIZE))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((IMAGE_MAX_SIZE, IMAGE_MAX_SIZE), Image.LANCZOS)
+    return image, fmt
+
+
+def normalize_image(image, fmt):
+    """The stored form of a photo: no metadata, at most IMAGE_MAX_SIZE, same format"""
+    if fmt == 'PNG':
+        return encode(image, 'PNG', optimize=True)
+    return encode(flatten(image), 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+
+def render_pdf_page(path):
+    """First page of a PDF as an image THUMBNAIL_SIZE on its longest side"""
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        page = pdf[0]
+        width, height = page.get_size()  # In points
+        return page.render(scale=THUMBNAIL_SIZE / max(width, height, 1)).to_pil()
+    finally:
+        pdf.close()
+
+
+def make_thumbnail(image):
+    image = flatten(image)
+    image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return encode(image, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+
+
+def unreadable_errors():
+    """Errors that mean the file itself is bad, so retrying cannot help"""
+    from PIL import Image, UnidentifiedImageError
+
+    errors = (UnidentifiedImageError, Image.DecompressionBombError, SyntaxError, OSError, ValueError)
+    try:
+        import pypdfium2 as pdfium
+        return errors + (pdfium.PdfiumError,)
+    except ImportError:
+        return errors
+
+
+def decode_upload(path):
+    """(image, format) for an upload; PDFs give their rendered first page and no format"""
+    if key_extension(path) in PDF_EXTENSIONS:
+        return render_pdf_page(path), None
+    return load_image(path)
+
+
+def build_derivatives(storage, key):
+    """(stored key, thumbnail key) for an upload; the stored key is new only if it shrank"""
+    with local_copy(storage, key) as path:
+        try:
+            image, fmt = decode_upload(path)
+            thumbnail = make_thumbnail(image)
+            normalized = normalize_image(image, fmt) if fmt else None
+        except unreadable_errors() as e:
+            logger.warning(f"Upload {key} could not be processed: {e.__class__.__name__}: {e}")
+            return key, None
+        size = os.path.getsize(path)
+
+    thumbnail_key = storage.save(thumbnail, 'thumbnail.jpg')
+    if normalized is None or normalized.getbuffer().nbytes >= size:
+        return key, thumbnail_key
+    # Same extension as the original, so the download name still matches
+    return storage.save(normalized, key), thumbnail_key
+
+
+def process_claim_upload(claim_id):
+    """Build the derivatives of a claim's upload and point the claim at them; True if it was downscaled"""
+    claim = db.session.get(WarrantyClaim, claim_id)
+    if claim is None or not claim.file_path or claim.upload_processed_at is not None:
+        return None
+
+    storage = current_app.extensions['storage']
+    original = claim.file_path
+    stored, thumbnail = original, None
+    if is_processable(original) and storage.exists(original):
+        stored, thumbnail = build_derivatives(storage, original)
+
+    # Keep updated_at as it is: it records the claim's decision time. The
+    # file_path condition leaves the claim alone if its upload changed meanwhile.
+    db.session.execute(
+        update(WarrantyClaim).where(
+            WarrantyClaim.id == claim_id, WarrantyClaim.file_path == original
+        ).values(
+            file_path=stored,
+            thumbnail_path=thumbnail,
+            upload_processed_at=datetime.utcnow(),
+            updated_at=WarrantyClaim.updated_at
+        ).returning(WarrantyClaim.id)
+    )
+    db.session.commit()
+
+    if stored != original:
+        schedule_removal([original])
+        logger.info(f"Upload for claim {claim_id} downscaled: {original} -> {stored}")
+    return stored != original
+
+
+# Keys are content hashes, so a new submission may save the same file again
+# while it is being deleted, and commit its claim only after the reference
+# check. Saving an existing file refreshes its modification time, so files
+# are deleted only after going REMOVAL_GRACE seconds without being saved,
+# by which time any submission that saved them has committed its claim.
+
+def schedule_removal(keys):
+    """Delete these uploads after REMOVAL_GRACE if no claim refers to them by then"""
+    for key in keys:
+        try:
+            enqueue('remove_upload', delay=REMOVAL_GRACE, key=key)
+        except Exception as e:
+            # Only leaves a spare copy behind
+            logger.error(f"Error queueing removal of upload {key}: {str(e)}")
+
+
+def remove_unreferenced(storage, key, grace=REMOVAL_GRACE):
+    """Delete an upload no claim refers to and nothing saved in the last `grace` seconds; True if deleted"""
+    if not storage.exists(key) or time.time() - storage.modified_at(key) < grace:
+        return False
+    referenced = db.session.query(WarrantyClaim.id).filter(
+        or_(WarrantyClaim.file_path == key, WarrantyClaim.thumbnail_path == key)
+    ).first()
+    if referenced is not None:
+        return False
+    storage.delete(key)
+    logger.info(f"Removed unreferenced upload {key}")
+    return True
+
+
+uploads_cli = AppGroup('uploads', help='Claim upload processing.')
+
+
+@uploads_cli.command('process')
+@click.option('--limit', type=int, help='Process at most this many claims.')
+@with_appcontext
+def process_command(limit):
+    """Process uploads of claims submitted before upload processing existed."""
+    query = db.session.query(WarrantyClaim.id).filter(
+        WarrantyClaim.file_path.isnot(None), WarrantyClaim.upload_processed_at.is_(None)
+    ).order_by(WarrantyClaim.id)
+    claim_ids = [claim_id for claim_id, in (query.limit(limit) if limit else query)]
+
+    downscaled = 0
+    for claim_id in claim_ids:
+        if process_claim_upload(claim_id):
+            downscaled += 1
+        db.session.remove()
+    click.echo(f"Processed {len(claim_ids)} uploads ({downscaled} downscaled)")
+
+
+def init_uploads(app):
+    app.cli.add_command(uploads_cli)
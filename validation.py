@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from models import WarrantyClaim
+
+# Rules shared by the claim form and bulk imports
+CLAIM_FIELDS = ('name', 'email', 'phone', 'product', 'purchase_date', 'issue', 'defect_reason', 'warranty_option')
+PURCHASE_DATE_FORMAT = '%Y-%m-%d'
+
+# Column lengths, so a value that would not fit is rejected up front
+FIELD_LIMITS = {
+    field: WarrantyClaim.__table__.c[field].type.length
+    for field in CLAIM_FIELDS
+    if getattr(WarrantyClaim.__table__.c[field].type, 'length', None)
+}
+
+
+def missing_fields(fields):
+    return [field for field in CLAIM_FIELDS if not fields.get(field)]
+
+
+def valid_purchase_date(value):
+    try:
+        datetime.strptime(value, PURCHASE_DATE_FORMAT)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def oversized_fields(fields):
+    """Fields longer than their database column allows"""
+    return [field for field, limit in FIELD_LIMITS.items() if len(fields.get(field) or '') > limit]
+
+
+def claim_errors(fields):
+    """All validation errors for a set of claim fields, empty if the claim is valid"""
+    errors = []
+    missing = missing_fields(fields)
+    if missing:
+        errors.append(f'Required fields missing: {", ".join(missing)}')
+    if fields.get('purchase_date') and not valid_purchase_date(fields['purchase_date']):
+        errors.append('Invalid purchase date format. Please use YYYY-MM-DD format.')
+    oversized = oversized_fields(fields)
+    if oversized:
+        errors.append(f'Fields too long: {", ".join(oversized)}')
+    return errors